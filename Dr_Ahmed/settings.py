@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,8 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so request latency covers the whole stack
+    'core.metrics.MetricsMiddleware',
+    # Early, so its SQL and total times include the session and user loads
+    # of the middleware below; process_view starts the view timing
+    'core.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -53,6 +60,22 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request SQL/template/view timings in a Server-Timing header, plus
+# sampled logs of slow requests. Off unless REQUEST_PROFILING=1.
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '') == '1'
+REQUEST_PROFILING_SLOW_MS = int(os.environ.get('REQUEST_PROFILING_SLOW_MS', 200))
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 1.0))
+REQUEST_PROFILING_TOP_N = 5
+
+# /metrics (Prometheus text format) is for logged-in staff and for scrapers
+# sending "Authorization: Bearer <METRICS_TOKEN>"; without a token set,
+# Prometheus cannot scrape it.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Import time allowed for loading the WSGI app (core.tests, audit_startup).
+# Containers scale to zero, so every cold start pays it.
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 1.5))
+
 ROOT_URLCONF = 'Dr_Ahmed.urls'
 
 TEMPLATES = [
@@ -76,6 +99,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'Dr_Ahmed.wsgi.application'
 
+# GUNICORN_PROFILE=asgi serves Dr_Ahmed.asgi on uvicorn workers (see
+# gunicorn.conf.py). The AJAX cart and review URLs then use the async
+# versions of their views; under WSGI the sync ones avoid a thread hop.
+ASYNC_VIEWS = os.environ.get('GUNICORN_PROFILE', 'wsgi') == 'asgi'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -83,10 +111,72 @@ WSGI_APPLICATION = 'Dr_Ahmed.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLITE_PATH points a process at another copy, e.g. benchmark_cart's
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# SQLite production profile (SQLITE_PROFILE=default turns it off): WAL so
+# readers never block the writer, write transactions that take the lock
+# up front (BEGIN IMMEDIATE) and persistent per-worker connections.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'production')
+SQLITE_PRAGMAS = {}
+if SQLITE_PROFILE == 'production':
+    DATABASES['default'].update({
+        # Under ASGI each request's database work runs on a thread of its
+        # own, so persistent connections would pile up instead of being reused
+        'CONN_MAX_AGE': 0 if ASYNC_VIEWS else 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            # Seconds sqlite3 waits on a locked database before raising
+            'timeout': 20,
+        },
+    })
+    # Applied to every new connection by core.db.apply_sqlite_pragmas
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 20000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative = KiB, i.e. 64 MiB
+        'temp_store': 'MEMORY',
+    }
+
+# Read replica (DATABASE_REPLICA=db_replica.sqlite3): catalogue and analytics
+# reads go to a copy of the primary that `manage.py sync_replica` refreshes.
+# Sessions that just wrote stay on the primary for REPLICA_STICKY_SECONDS,
+# which should be longer than the sync interval.
+DATABASE_REPLICA = os.environ.get('DATABASE_REPLICA', '')
+if DATABASE_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / DATABASE_REPLICA,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 30))
+
+
+# Shared cache for rankings and product lookups. Every worker on the host
+# shares the file cache; set REDIS_URL when running on several hosts.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.django_cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,10 +223,20 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Production media serving: set to 'X-Sendfile' (Apache/lighttpd) or
+# 'X-Accel-Redirect' (nginx) so the front-end server streams the bytes.
+MEDIA_OFFLOAD_HEADER = os.environ.get('MEDIA_OFFLOAD_HEADER', '')
+# Internal nginx location that aliases MEDIA_ROOT (used with X-Accel-Redirect)
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Rejected-rows files from dashboard CSV imports (not publicly served)
+PRODUCT_IMPORT_DIR = BASE_DIR / 'imports'
+
 # Cart session settings
 CART_SESSION_ID = 'cart'
@@ -14,19 +14,31 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from core import views as core_views
 from core.views import (
     home, contact, about, product, cart, search,
-    add_to_cart, remove_from_cart, update_cart_quantity, get_cart_info,
     dashboard, add_product, edit_product, delete_product, toggle_product_availability,
-    update_product_partial, submit_review, submit_site_review
+    update_product_partial, bulk_update_products, import_products_csv, download_import_rejects,
+    export_dataset, product_cache_stats,
 )
+from core.api import product_list, product_reviews
+from core.media import serve_media
+from core.metrics import metrics_view
+
+
+def ajax_view(name):
+    """The sync view, or its ``a``-prefixed async twin under the ASGI profile"""
+    return getattr(core_views, f'a{name}' if settings.ASYNC_VIEWS else name)
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', home, name='home'),
     path('search/', search, name='search'),
     path('about/', about, name='about'),
@@ -35,13 +47,17 @@ urlpatterns = [
     path('product/', product, name='product_default'),
     path('cart/', cart, name='cart'),
     # AJAX Cart endpoints
-    path('cart/add/', add_to_cart, name='add_to_cart'),
-    path('cart/remove/', remove_from_cart, name='remove_from_cart'),
-    path('cart/update/', update_cart_quantity, name='update_cart_quantity'),
-    path('cart/info/', get_cart_info, name='get_cart_info'),
+    path('cart/add/', ajax_view('add_to_cart'), name='add_to_cart'),
+    path('cart/remove/', ajax_view('remove_from_cart'), name='remove_from_cart'),
+    path('cart/update/', ajax_view('update_cart_quantity'), name='update_cart_quantity'),
+    path('cart/info/', ajax_view('get_cart_info'), name='get_cart_info'),
+    path('cart/batch/', ajax_view('batch_update_cart'), name='batch_update_cart'),
+    # Read-only JSON API
+    path('api/products/', product_list, name='api_product_list'),
+    path('api/products/<int:product_id>/reviews/', product_reviews, name='api_product_reviews'),
     # Review endpoints
-    path('review/submit/', submit_review, name='submit_review'),
-    path('site-review/submit/', submit_site_review, name='submit_site_review'),
+    path('review/submit/', ajax_view('submit_review'), name='submit_review'),
+    path('site-review/submit/', ajax_view('submit_site_review'), name='submit_site_review'),
     # Dashboard endpoints
     path('dashboard/', dashboard, name='dashboard'),
     path('dashboard/add-product/', add_product, name='add_product'),
@@ -49,8 +65,14 @@ urlpatterns = [
     path('dashboard/delete-product/<int:product_id>/', delete_product, name='delete_product'),
     path('dashboard/toggle-availability/<int:product_id>/', toggle_product_availability, name='toggle_product_availability'),
     path('dashboard/update-product/<int:product_id>/', update_product_partial, name='update_product_partial'),
+    path('dashboard/bulk-update/', bulk_update_products, name='bulk_update_products'),
+    path('dashboard/import-products/', import_products_csv, name='import_products_csv'),
+    path('dashboard/import-products/rejects/<str:filename>/', download_import_rejects, name='download_import_rejects'),
+    path('dashboard/export/<str:dataset>/', export_dataset, name='export_dataset'),
+    path('dashboard/cache-stats/', product_cache_stats, name='product_cache_stats'),
 ]
 
-# Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Serve media files (conditional GET, ranges and X-Sendfile/X-Accel-Redirect offload)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
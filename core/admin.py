@@ -1,3 +1,129 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .models import Product, ProductDailySales, PurchaseHistory, Review, SiteReview, VisitorCounter
+from .product_cache import invalidate_product_cache
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Unfiltered changelists take their count from the primary key range
+    (two index lookups) instead of a COUNT(*) over the whole table. These
+    tables are append-mostly, so the estimate is close; filtered lists are
+    usually small and still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return super().count
+        bounds = queryset.model._default_manager.using(queryset.db).aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['high'] is None:
+            return 0
+        return bounds['high'] - bounds['low'] + 1
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Defaults for tables with millions of rows: estimated counts, no second
+    full-table count for the "N total" link, foreign keys as raw ids (no
+    <select> of every product) and no per-object delete_selected action.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'category', 'price', 'discount', 'effective_price', 'stock', 'is_available')
+    list_filter = ('is_available',)
+    search_fields = ('name', '=sku')
+    readonly_fields = ('effective_price', 'created_at', 'updated_at')
+    show_full_result_count = False
+
+    # Deleting from the admin soft-deletes like the dashboard does; the purge
+    # job removes the rows and their history later
+
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        now = timezone.now()
+        queryset.update(is_deleted=True, deleted_at=now, sku=None, updated_at=now)
+        # update() sends no post_save
+        invalidate_product_cache()
+
+    def get_deleted_objects(self, objs, request):
+        # Nothing cascades now, so the confirmation page lists only the
+        # products instead of collecting every review and purchase
+        objs = list(objs)
+        perms_needed = set() if self.has_delete_permission(request) else {self.opts.verbose_name}
+        return [str(obj) for obj in objs], {self.opts.verbose_name_plural: len(objs)}, perms_needed, []
+
+
+@admin.register(Review)
+class ReviewAdmin(LargeTableAdmin):
+    list_display = ('id', 'product', 'reviewer_name', 'rating', 'created_at')
+    list_select_related = ('product',)
+    list_filter = ('rating',)
+    raw_id_fields = ('product',)
+    date_hierarchy = 'created_at'
+
+
+@admin.register(PurchaseHistory)
+class PurchaseHistoryAdmin(LargeTableAdmin):
+    list_display = ('id', 'product', 'quantity', 'user', 'session_key', 'purchase_date')
+    list_select_related = ('product', 'user')
+    raw_id_fields = ('product', 'user')
+    date_hierarchy = 'purchase_date'
+
+
+@admin.register(ProductDailySales)
+class ProductDailySalesAdmin(LargeTableAdmin):
+    list_display = ('date', 'product', 'units', 'revenue')
+    list_select_related = ('product',)
+    raw_id_fields = ('product',)
+    date_hierarchy = 'date'
+
+
+@admin.register(SiteReview)
+class SiteReviewAdmin(LargeTableAdmin):
+    list_display = ('id', 'reviewer_name', 'rating', 'is_approved', 'created_at')
+    list_filter = ('is_approved', 'rating')
+    actions = ('approve_reviews', 'unapprove_reviews')
+
+    @admin.action(permissions=['change'], description='Approve selected site reviews')
+    def approve_reviews(self, request, queryset):
+        # One UPDATE for the whole selection
+        updated = queryset.update(is_approved=True)
+        self.message_user(request, f'{updated} site reviews approved.')
+
+    @admin.action(permissions=['change'], description='Hide selected site reviews')
+    def unapprove_reviews(self, request, queryset):
+        updated = queryset.update(is_approved=False)
+        self.message_user(request, f'{updated} site reviews hidden.')
+
+
+@admin.register(VisitorCounter)
+class VisitorCounterAdmin(LargeTableAdmin):
+    list_display = ('id', 'ip_address', 'page_visited', 'visit_date')
+    search_fields = ('=ip_address',)
+    date_hierarchy = 'visit_date'
+    actions = ('purge_visitors',)
+
+    @admin.action(permissions=['delete'], description='Purge selected visits')
+    def purge_visitors(self, request, queryset):
+        # Nothing references visits and no signals listen, so this is a
+        # single DELETE even for "select all"
+        deleted, _ = queryset.delete()
+        self.message_user(request, f'{deleted} visits purged.')
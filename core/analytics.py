@@ -0,0 +1,112 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import ProductDailySales, PurchaseHistory, RollupCheckpoint
+
+
+DAILY_SALES_CHECKPOINT = 'product_daily_sales'
+ROLLUP_BATCH_SIZE = 5000
+
+
+def discounted_revenue(prefix=''):
+    """quantity x the stored price after discount (Product.effective_price)"""
+    return ExpressionWrapper(
+        F('quantity') * F(f'{prefix}effective_price'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def rollup_daily_sales_batch(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Fold the next ``batch_size`` PurchaseHistory rows into ProductDailySales.
+
+    The rollup rows and the checkpoint are written in the same transaction,
+    so an interrupted run never double counts. Returns the number of
+    purchases folded in (0 when caught up).
+    """
+    with transaction.atomic():
+        checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(name=DAILY_SALES_CHECKPOINT)
+        pending = PurchaseHistory.objects.filter(id__gt=checkpoint.last_id).order_by('id')
+        upper = pending.values_list('id', flat=True)[batch_size - 1:batch_size].first()
+        if upper is None:
+            upper = pending.order_by('-id').values_list('id', flat=True).first()
+            if upper is None:
+                return 0
+
+        purchases = PurchaseHistory.objects.filter(id__gt=checkpoint.last_id, id__lte=upper)
+        folded = purchases.count()
+        totals = (
+            purchases.order_by()
+            .annotate(day=TruncDate('purchase_date'))
+            .values('product_id', 'day')
+            .annotate(units=Sum('quantity'), revenue=Sum(discounted_revenue('product__')))
+        )
+        totals = {(row['product_id'], row['day']): row for row in totals}
+
+        existing = ProductDailySales.objects.filter(
+            product_id__in={product_id for product_id, _ in totals},
+            date__in={day for _, day in totals},
+        )
+        to_update = []
+        for rollup in existing:
+            row = totals.pop((rollup.product_id, rollup.date), None)
+            if row is None:
+                continue
+            rollup.units += row['units']
+            rollup.revenue += row['revenue'] or 0
+            to_update.append(rollup)
+        ProductDailySales.objects.bulk_update(to_update, ['units', 'revenue'], batch_size=500)
+        ProductDailySales.objects.bulk_create(
+            [
+                ProductDailySales(product_id=product_id, date=day, units=row['units'], revenue=row['revenue'] or 0)
+                for (product_id, day), row in totals.items()
+            ],
+            batch_size=500,
+        )
+
+        checkpoint.last_id = upper
+        checkpoint.save()
+    return folded
+
+
+def sales_summary(days=30, movers=5):
+    """Dashboard numbers, read from the rollup table only"""
+    today = timezone.now().date()
+    since = today - datetime.timedelta(days=days - 1)
+    week_ago = today - datetime.timedelta(days=6)
+    two_weeks_ago = today - datetime.timedelta(days=13)
+
+    trend = list(
+        ProductDailySales.objects.filter(date__gte=since)
+        .order_by().values('date')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('date')
+    )
+    peak = max((day['units'] for day in trend), default=0)
+    for day in trend:
+        day['percent'] = round(day['units'] * 100 / peak) if peak else 0
+
+    top_movers = list(
+        ProductDailySales.objects.filter(date__gte=two_weeks_ago)
+        .order_by().values('product_id', 'product__name')
+        .annotate(
+            this_week=Coalesce(Sum('units', filter=Q(date__gte=week_ago)), 0),
+            last_week=Coalesce(Sum('units', filter=Q(date__lt=week_ago)), 0),
+        )
+        .annotate(change=F('this_week') - F('last_week'))
+        .order_by('-change')[:movers]
+    )
+
+    checkpoint = RollupCheckpoint.objects.filter(name=DAILY_SALES_CHECKPOINT).first()
+    return {
+        'days': days,
+        'trend': trend,
+        'units': sum(day['units'] for day in trend),
+        'revenue': sum((day['revenue'] for day in trend), 0),
+        'top_movers': top_movers,
+        'rolled_up_at': checkpoint.updated_at if checkpoint else None,
+    }
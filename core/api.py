@@ -0,0 +1,220 @@
+import base64
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_safe
+
+from .conditional import catalogue_version
+from .models import Product, Review
+from .reviews import MAX_REVIEWS_PAGE_SIZE, REVIEWS_PAGE_SIZE, ReviewQueryError, parse_ratings, review_page
+
+
+# Fields that may be requested through ``?fields=``
+PRODUCT_API_FIELDS = (
+    'id', 'name', 'category', 'price', 'discount', 'effective_price', 'stock', 'is_available',
+    'description', 'image', 'created_at', 'updated_at',
+)
+DEFAULT_PRODUCT_API_FIELDS = ('id', 'name', 'category', 'price', 'discount', 'image', 'is_available')
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+# ?sort= values and their keyset order
+PRODUCT_API_SORTS = {
+    'newest': ('-id',),
+    'price': ('effective_price', 'id'),
+    '-price': ('-effective_price', '-id'),
+}
+
+
+class ApiError(ValueError):
+    pass
+
+
+def encode_cursor(product_id, price=None):
+    position = {'id': product_id}
+    if price is not None:
+        position['p'] = str(price)
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, with_price=False):
+    """``id``, or ``(effective_price, id)`` for cursors of price-sorted pages"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+        product_id = int(position['id'])
+        return (Decimal(position['p']), product_id) if with_price else product_id
+    except (ValueError, KeyError, TypeError, InvalidOperation):
+        raise ApiError('Invalid cursor.')
+
+
+def parse_price(raw, name):
+    if not raw:
+        return None
+    try:
+        price = Decimal(raw)
+    except InvalidOperation:
+        raise ApiError(f'Invalid {name}.')
+    if not price.is_finite() or price < 0:
+        raise ApiError(f'Invalid {name}.')
+    return price
+
+
+def parse_fields(raw):
+    if not raw:
+        return list(DEFAULT_PRODUCT_API_FIELDS)
+    fields = []
+    for field in raw.split(','):
+        field = field.strip()
+        if field not in PRODUCT_API_FIELDS:
+            raise ApiError(f'Unknown field "{field}".')
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+
+def parse_limit(raw):
+    if not raw:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ApiError('Invalid limit.')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def products_etag(request):
+    """
+    The response body is a pure function of the catalogue version and the
+    query string, so hashing both gives a strong validator without running
+    the page query.
+    """
+    catalogue = catalogue_version()
+    params = sorted(request.GET.lists())
+    return hashlib.md5(repr((catalogue, params)).encode(), usedforsecurity=False).hexdigest()
+
+
+@require_safe
+@condition(etag_func=products_etag)
+def product_list(request):
+    """
+    Read-only catalogue listing.
+
+    Query parameters: ``fields`` (comma separated), ``category``,
+    ``available`` (``true``/``false``/``all``, default ``true``),
+    ``min_price``/``max_price`` (inclusive, on the discounted price),
+    ``sort`` (``newest``, ``price`` or ``-price``), ``limit`` and
+    ``cursor`` (opaque, from ``next_cursor``).
+    """
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        limit = parse_limit(request.GET.get('limit'))
+        cursor = request.GET.get('cursor')
+        sort = request.GET.get('sort', 'newest')
+        if sort not in PRODUCT_API_SORTS:
+            raise ApiError('sort must be newest, price or -price.')
+
+        products = Product.objects.all()
+
+        available = request.GET.get('available', 'true').lower()
+        if available == 'true':
+            products = products.filter(is_available=True)
+        elif available == 'false':
+            products = products.filter(is_available=False)
+        elif available != 'all':
+            raise ApiError('available must be true, false or all.')
+
+        category = request.GET.get('category', '')
+        if category:
+            products = products.filter(category__icontains=category)
+
+        min_price = parse_price(request.GET.get('min_price'), 'min_price')
+        if min_price is not None:
+            products = products.filter(effective_price__gte=min_price)
+        max_price = parse_price(request.GET.get('max_price'), 'max_price')
+        if max_price is not None:
+            products = products.filter(effective_price__lte=max_price)
+
+        if cursor and sort == 'newest':
+            products = products.filter(id__lt=decode_cursor(cursor))
+        elif cursor:
+            price, product_id = decode_cursor(cursor, with_price=True)
+            if sort == 'price':
+                after = Q(effective_price__gt=price) | Q(effective_price=price, id__gt=product_id)
+            else:
+                after = Q(effective_price__lt=price) | Q(effective_price=price, id__lt=product_id)
+            products = products.filter(after)
+    except ApiError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    # Newest first by default; ids grow with created_at so they make a
+    # stable keyset, and break ties between equal prices
+    by_price = sort != 'newest'
+    columns = fields if 'id' in fields else ['id'] + fields
+    if by_price and 'effective_price' not in columns:
+        columns = columns + ['effective_price']
+    rows = list(products.order_by(*PRODUCT_API_SORTS[sort]).values(*columns)[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['id'], last['effective_price'] if by_price else None)
+
+    media_url = settings.MEDIA_URL
+    for row in rows:
+        if 'image' in row:
+            row['image'] = media_url + row['image'] if row['image'] else None
+        if 'id' not in fields:
+            del row['id']
+        if 'effective_price' in row and 'effective_price' not in fields:
+            del row['effective_price']
+
+    return JsonResponse({'results': rows, 'next_cursor': next_cursor})
+
+
+def reviews_etag(request, product_id):
+    """
+    The latest change and the count identify the list: additions and edits
+    move ``updated_at``, deletions the count
+    """
+    latest = Review.objects.filter(product_id=product_id).aggregate(last=Max('updated_at'), count=Count('id'))
+    params = sorted(request.GET.lists())
+    return hashlib.md5(repr((product_id, latest, params)).encode(), usedforsecurity=False).hexdigest()
+
+
+@require_safe
+def product_reviews(request, product_id):
+    """
+    A product's reviews, newest first.
+
+    Query parameters: ``rating`` (comma separated, e.g. ``4,5``),
+    ``min_rating``, ``limit`` and ``cursor`` (opaque, from ``next_cursor``).
+    """
+    # Checked before the ETag, whose reviews outlive a soft delete until the
+    # purge, so a deleted product's cached list cannot be revalidated
+    if not Product.objects.filter(pk=product_id).exists():
+        return JsonResponse({'success': False, 'message': 'Product not found.'}, status=404)
+    return _product_reviews(request, product_id)
+
+
+@condition(etag_func=reviews_etag)
+def _product_reviews(request, product_id):
+    try:
+        ratings = parse_ratings(request.GET.get('rating'))
+        min_rating = request.GET.get('min_rating')
+        min_rating = int(min_rating) if min_rating else None
+        limit = request.GET.get('limit')
+        limit = max(1, min(int(limit), MAX_REVIEWS_PAGE_SIZE)) if limit else REVIEWS_PAGE_SIZE
+        rows, next_cursor = review_page(
+            product_id, request.GET.get('cursor'), ratings=ratings, min_rating=min_rating, limit=limit
+        )
+    except ReviewQueryError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'min_rating and limit must be integers.'}, status=400)
+
+    return JsonResponse({'results': rows, 'next_cursor': next_cursor})
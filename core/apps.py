@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from .db import apply_sqlite_pragmas
+        from .models import Product
+        from .product_cache import invalidate_product_cache
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='core.apply_sqlite_pragmas')
+        post_save.connect(invalidate_product_cache, sender=Product, dispatch_uid='core.product_cache.save')
+        post_delete.connect(invalidate_product_cache, sender=Product, dispatch_uid='core.product_cache.delete')
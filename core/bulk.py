@@ -0,0 +1,183 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from .models import Product
+from .product_cache import invalidate_product_cache
+
+
+SETTABLE_FIELDS = ['name', 'category', 'price', 'stock', 'discount', 'description', 'is_available']
+ADDABLE_FIELDS = ['price', 'stock', 'discount']
+MULTIPLIABLE_FIELDS = ['price', 'discount']
+MAX_OPERATIONS = 100
+RESULT_BATCH_SIZE = 500
+
+
+class BulkOperationError(ValueError):
+    """Raised when a bulk request is malformed; nothing has been applied"""
+
+
+def _decimal(field, value):
+    try:
+        value = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise BulkOperationError(f'Invalid {field} value.')
+    if not value.is_finite():
+        raise BulkOperationError(f'Invalid {field} value.')
+    return value
+
+
+def _set_value(field, value):
+    """Same conversions and checks as update_product_partial"""
+    if field in ['price', 'discount']:
+        if value in (None, ''):
+            value = 0
+        value = _decimal(field, value)
+        if value < 0:
+            raise BulkOperationError(f'{field} cannot be negative.')
+        if field == 'discount' and value > 100:
+            raise BulkOperationError('Discount percentage cannot exceed 100%.')
+        return value
+    if field == 'stock':
+        try:
+            value = int(value) if value not in (None, '') else 0
+        except (ValueError, TypeError):
+            raise BulkOperationError('Invalid stock value. Must be a positive integer.')
+        if value < 0:
+            raise BulkOperationError('Stock cannot be negative.')
+        return value
+    if field == 'is_available':
+        return bool(value)
+    if not isinstance(value, str) or not value.strip():
+        raise BulkOperationError(f'{field.title()} cannot be empty.')
+    value = value.strip()
+    if field == 'category':
+        value = value.title()
+    return value
+
+
+def parse_operation(index, data):
+    """
+    Turn one operation into ``(ids, selector, updates)``.
+
+    An operation selects products by ``ids`` and/or ``category`` and lists
+    changes under ``set`` (literal values), ``add`` (``stock += 50``) and
+    ``multiply`` (``price *= 1.1``).
+    """
+    if not isinstance(data, dict):
+        raise BulkOperationError(f'Operation {index} must be an object.')
+
+    ids = data.get('ids')
+    category = data.get('category')
+    if ids is None and not category:
+        raise BulkOperationError(f'Operation {index} needs "ids" or "category".')
+    selector = Q()
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise BulkOperationError(f'Operation {index}: "ids" must be a non-empty list.')
+        try:
+            ids = [int(product_id) for product_id in ids]
+        except (ValueError, TypeError):
+            raise BulkOperationError(f'Operation {index}: product ids must be integers.')
+        selector &= Q(id__in=ids)
+    if category:
+        selector &= Q(category__iexact=str(category).strip())
+
+    updates = {}
+    for action, allowed in (('set', SETTABLE_FIELDS), ('add', ADDABLE_FIELDS), ('multiply', MULTIPLIABLE_FIELDS)):
+        changes = data.get(action) or {}
+        if not isinstance(changes, dict):
+            raise BulkOperationError(f'Operation {index}: "{action}" must be an object.')
+        for field, value in changes.items():
+            if field not in allowed:
+                raise BulkOperationError(f'Operation {index}: cannot {action} "{field}".')
+            if field in updates:
+                raise BulkOperationError(f'Operation {index}: "{field}" is changed twice.')
+            try:
+                if action == 'set':
+                    updates[field] = _set_value(field, value)
+                elif action == 'add':
+                    delta = int(value) if field == 'stock' else _decimal(field, value)
+                    updates[field] = Coalesce(F(field), Value(0, output_field=Product._meta.get_field(field))) + delta
+                else:
+                    factor = _decimal(field, value)
+                    if factor < 0:
+                        raise BulkOperationError(f'{field} factor cannot be negative.')
+                    updates[field] = Round(F(field) * factor, 2)
+            except BulkOperationError as e:
+                raise BulkOperationError(f'Operation {index}: {e}')
+            except (ValueError, TypeError):
+                raise BulkOperationError(f'Operation {index}: invalid {field} value.')
+
+    if not updates:
+        raise BulkOperationError(f'Operation {index} has no changes.')
+    return ids, selector, updates
+
+
+def apply_bulk_operations(operations):
+    """
+    Validate every operation, then apply them in order inside one
+    transaction with one ``UPDATE`` each.
+
+    Returns ``(success, results)`` where ``results`` holds one entry per
+    touched product. Any row left with a negative price/stock or a discount
+    outside 0-100 rolls the whole batch back.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BulkOperationError('"operations" must be a non-empty list.')
+    if len(operations) > MAX_OPERATIONS:
+        raise BulkOperationError(f'At most {MAX_OPERATIONS} operations per request.')
+
+    parsed = [parse_operation(index, data) for index, data in enumerate(operations)]
+
+    # Unknown ids are reported before anything is written
+    requested_ids = {product_id for ids, _, _ in parsed if ids for product_id in ids}
+    existing_ids = set(Product.objects.filter(id__in=requested_ids).values_list('id', flat=True))
+    missing = sorted(requested_ids - existing_ids)
+    if missing:
+        return False, [{'id': product_id, 'success': False, 'errors': ['Product not found.']}
+                       for product_id in missing]
+
+    touched_fields = set()
+    affected_ids = set()
+    with transaction.atomic():
+        now = timezone.now()
+        for ids, selector, updates in parsed:
+            products = Product.objects.filter(selector)
+            # Resolve ids first: a "set" may move rows out of their selector
+            affected_ids.update(products.values_list('id', flat=True))
+            # update() skips auto_now, so keep updated_at (and the page validators) honest
+            products.update(updated_at=now, **updates)
+            touched_fields.update(updates)
+        # update() sends no post_save
+        invalidate_product_cache()
+
+        affected_ids = sorted(affected_ids)
+        columns = ['id'] + sorted(touched_fields)
+        rows = []
+        for start in range(0, len(affected_ids), RESULT_BATCH_SIZE):
+            batch = affected_ids[start:start + RESULT_BATCH_SIZE]
+            rows.extend(Product.objects.filter(id__in=batch).order_by('id').values(*columns))
+
+        results = []
+        for row in rows:
+            errors = []
+            if row.get('price') is not None and row['price'] < 0:
+                errors.append('Price cannot be negative.')
+            if row.get('stock') is not None and row['stock'] < 0:
+                errors.append('Stock cannot be negative.')
+            if row.get('discount') is not None and not 0 <= row['discount'] <= 100:
+                errors.append('Discount must be between 0 and 100%.')
+            if errors:
+                results.append({'id': row['id'], 'success': False, 'errors': errors})
+            else:
+                results.append(dict(row, success=True))
+
+        success = all(result['success'] for result in results)
+        if not success:
+            transaction.set_rollback(True)
+            results = [result for result in results if not result['success']]
+    return success, results
@@ -1,8 +1,54 @@
 from decimal import Decimal
 from django.conf import settings
+from django.db.models import Case, Count, DecimalField, F, Sum, When
+from .metrics import CART_MUTATIONS
 from .models import Product, Cart, CartItem
 
 
+# Operations accepted by the batched cart endpoint, in one request
+CART_OPERATIONS = ('add', 'update', 'remove')
+MAX_CART_OPERATIONS = 100
+
+
+class CartOperationError(ValueError):
+    """Raised when a batch of cart operations is malformed; nothing has been applied"""
+
+
+def parse_cart_operation(index, data):
+    """
+    Turn ``{"op": "add"|"update"|"remove", "product_id": 3, "quantity": 2}``
+    into ``(op, product_id, quantity)``. ``add`` defaults to one unit;
+    ``update`` to zero or less removes the product, as on the cart page.
+    """
+    if not isinstance(data, dict):
+        raise CartOperationError(f'Operation {index} must be an object.')
+    op = data.get('op')
+    if op not in CART_OPERATIONS:
+        raise CartOperationError(f'Operation {index}: "op" must be add, update or remove.')
+    try:
+        product_id = int(data.get('product_id'))
+    except (ValueError, TypeError):
+        raise CartOperationError(f'Operation {index}: invalid product id.')
+
+    quantity = None
+    if op != 'remove':
+        try:
+            quantity = int(data['quantity'] if op == 'update' else data.get('quantity', 1))
+        except (KeyError, ValueError, TypeError):
+            raise CartOperationError(f'Operation {index}: invalid quantity.')
+        if op == 'add' and quantity < 1:
+            raise CartOperationError(f'Operation {index}: quantity must be at least 1.')
+    return op, product_id, quantity
+
+
+def parse_cart_operations(operations):
+    if not isinstance(operations, list) or not operations:
+        raise CartOperationError('"operations" must be a non-empty list.')
+    if len(operations) > MAX_CART_OPERATIONS:
+        raise CartOperationError(f'At most {MAX_CART_OPERATIONS} operations per request.')
+    return [parse_cart_operation(index, data) for index, data in enumerate(operations)]
+
+
 class CartManager:
     """
     Session-based cart management system
@@ -18,22 +64,52 @@ class CartManager:
             cart = self.session[settings.CART_SESSION_ID] = {}
         self.cart = cart
     
+    @classmethod
+    async def afor_request(cls, request):
+        """
+        Async counterpart of ``CartManager(request)``: loads the session and
+        user without blocking the event loop
+        """
+        self = cls.__new__(cls)
+        self.session = request.session
+        user = await request.auser()
+        self.user = user if user.is_authenticated else None
+        
+        cart = await self.session.aget(settings.CART_SESSION_ID)
+        if not cart:
+            cart = {}
+            await self.session.aset(settings.CART_SESSION_ID, cart)
+        self.cart = cart
+        return self
+    
+    def _keep_only(self, product_ids):
+        """
+        Drop items whose product was deleted since they were added, so item
+        counts (``len``, ``get_total_items``) agree with the priced totals.
+        Called with the ids the pricing queries found, so it costs no query.
+        """
+        existing = {str(product_id) for product_id in product_ids}
+        gone = [product_id for product_id in self.cart if product_id not in existing]
+        for product_id in gone:
+            del self.cart[product_id]
+        if gone:
+            self.save()
+    
     def add(self, product, quantity=1, override_quantity=False):
         """
         Add a product to the cart or update its quantity
         """
         product_id = str(product.id)
         if product_id not in self.cart:
-            self.cart[product_id] = {
-                'quantity': 0,
-                'price': str(product.get_discounted_price())
-            }
+            # No price snapshot: items are always priced from effective_price
+            self.cart[product_id] = {'quantity': 0}
         
         if override_quantity:
             self.cart[product_id]['quantity'] = quantity
         else:
             self.cart[product_id]['quantity'] += quantity
         
+        CART_MUTATIONS.labels('add').inc()
         self.save()
     
     def save(self):
@@ -49,6 +125,7 @@ class CartManager:
         product_id = str(product.id)
         if product_id in self.cart:
             del self.cart[product_id]
+            CART_MUTATIONS.labels('remove').inc()
             self.save()
     
     def update_quantity(self, product, quantity):
@@ -61,14 +138,64 @@ class CartManager:
                 self.remove(product)
             else:
                 self.cart[product_id]['quantity'] = quantity
+                CART_MUTATIONS.labels('update').inc()
                 self.save()
     
+    def apply_operations(self, operations, products):
+        """
+        Apply parsed operations in order. ``products`` maps every product id
+        in them to its Product, so nothing here can fail half way. Returns
+        the ``(product, quantity)`` pairs that were added.
+        """
+        added = []
+        for op, product_id, quantity in operations:
+            product = products[product_id]
+            if op == 'add':
+                self.add(product, quantity)
+                added.append((product, quantity))
+            elif op == 'update':
+                self.update_quantity(product, quantity)
+            else:
+                self.remove(product)
+        return added
+    
+    def _total_query(self):
+        """
+        One aggregate of quantity x current effective_price over the cart,
+        and of how many of its products still exist
+        """
+        lines = [
+            When(id=int(product_id), then=F('effective_price') * item['quantity'])
+            for product_id, item in self.cart.items()
+        ]
+        total = Sum(Case(*lines, output_field=DecimalField(max_digits=14, decimal_places=2)))
+        return Product.objects.filter(id__in=self.cart.keys()), {'total': total, 'found': Count('id')}
+    
     def get_total_price(self):
         """
-        Calculate the total price of all items in the cart
+        Calculate the total price of all items in the cart, in the database
         """
-        return sum(Decimal(item['price']) * item['quantity'] 
-                  for item in self.cart.values())
+        if not self.cart:
+            return Decimal('0.00')
+        products, aggregates = self._total_query()
+        totals = products.aggregate(**aggregates)
+        if totals['found'] < len(self.cart):
+            # Rare: a product was deleted since it was added
+            self._keep_only(products.values_list('id', flat=True))
+        # SQLite sums decimals as numbers; keep the price scale
+        return (totals['total'] or Decimal('0')).quantize(Decimal('0.01'))
+    
+    async def aget_total_price(self):
+        """
+        Async ``get_total_price`` for async views
+        """
+        if not self.cart:
+            return Decimal('0.00')
+        products, aggregates = self._total_query()
+        totals = await products.aaggregate(**aggregates)
+        if totals['found'] < len(self.cart):
+            self._keep_only([product_id async for product_id in products.values_list('id', flat=True)])
+        return (totals['total'] or Decimal('0')).quantize(Decimal('0.01'))
     
     def get_total_items(self):
         """
@@ -81,23 +208,25 @@ class CartManager:
         Remove cart from session
         """
         del self.session[settings.CART_SESSION_ID]
+        CART_MUTATIONS.labels('clear').inc()
         self.save()
     
     def __iter__(self):
         """
         Iterate over the items in the cart and get the products from the database
         """
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
+        products = {str(product.id): product for product in Product.objects.filter(id__in=self.cart.keys())}
+        self._keep_only(products)
         
-        for product in products:
-            cart[str(product.id)]['product'] = product
-        
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        # Fresh dicts: the session's own items must stay JSON serializable
+        for product_id, item in self.cart.items():
+            product = products[product_id]
+            yield {
+                'product': product,
+                'quantity': item['quantity'],
+                'price': product.effective_price,
+                'total_price': product.effective_price * item['quantity']
+            }
     
     def __len__(self):
         """
@@ -119,6 +248,37 @@ class CartManager:
             })
         return items
     
+    def _item_data(self, rows):
+        """JSON-ready items from ``(id, name, effective_price)`` rows, in cart order"""
+        products = {str(product_id): (name, price) for product_id, name, price in rows}
+        self._keep_only(products)
+        items = []
+        for product_id, item in self.cart.items():
+            name, price = products[product_id]
+            items.append({
+                'product_id': int(product_id),
+                'name': name,
+                'quantity': item['quantity'],
+                'price': str(price),
+                'total_price': str(price * item['quantity'])
+            })
+        return items
+    
+    def _item_rows(self):
+        return Product.objects.filter(id__in=self.cart.keys()).values_list('id', 'name', 'effective_price')
+    
+    def get_cart_item_data(self):
+        """
+        Cart items as JSON-ready dicts, with names and current prices from one query
+        """
+        return self._item_data(self._item_rows())
+    
+    async def aget_cart_item_data(self):
+        """
+        Async ``get_cart_item_data`` for async views
+        """
+        return self._item_data([row async for row in self._item_rows()])
+    
     def sync_with_database(self):
         """
         Sync session cart with database cart for authenticated users
@@ -157,10 +317,7 @@ class CartManager:
             
             # Load items from database to session
             for item in cart.items.all():
-                self.cart[str(item.product.id)] = {
-                    'quantity': item.quantity,
-                    'price': str(item.product.get_discounted_price())
-                }
+                self.cart[str(item.product.id)] = {'quantity': item.quantity}
             self.save()
         except Cart.DoesNotExist:
             pass
\ No newline at end of file
@@ -0,0 +1,111 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .models import Product, ProductRecommendation, Review, PurchaseHistory, RollupCheckpoint, SiteReview, VisitorCounter
+
+
+def catalogue_version():
+    """Latest product change and product count, from one indexed aggregate"""
+    return Product.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+
+
+def _session_state(request):
+    """
+    Per-visitor bits that end up in every page: the header cart counter
+    and the CSRF cookie embedded in forms.
+    """
+    cart = request.session.get(settings.CART_SESSION_ID) or {}
+    cart_items = sum(item['quantity'] for item in cart.values())
+    return cart_items, request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+
+
+def conditional_page(validators):
+    """
+    Decorator for read-only pages.
+
+    ``validators(request, *args, **kwargs)`` returns the parts of an ETag
+    computed from cheap lookups, or ``None`` to skip the check. When the
+    request's If-None-Match matches, the view is not run at all and a 304
+    is returned.
+
+    There is deliberately no Last-Modified: every page also carries the
+    visitor's cart counter and CSRF token, which no timestamp covers, so a
+    client revalidating with If-Modified-Since alone could be sent a 304
+    for a page that changed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            result = validators(request, *args, **kwargs)
+            if result is None:
+                return view(request, *args, **kwargs)
+
+            digest = hashlib.md5(
+                repr((result, _session_state(request))).encode(),
+                usedforsecurity=False,
+            ).hexdigest()
+            etag = quote_etag(digest)
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response.headers.setdefault('ETag', etag)
+            # Stored copies must always be revalidated: pages carry per-session state
+            patch_cache_control(response, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+def product_validators(request, product_id=None):
+    """
+    Product row, its latest review, purchase and recommendations in a single
+    query, plus the catalogue version: the recommendation strips show other
+    products' names, prices and stock
+    """
+    if not product_id:
+        return None
+    reviews = Review.objects.filter(product=OuterRef('pk'))
+    row = Product.objects.filter(pk=product_id).annotate(
+        last_review=Subquery(reviews.order_by('-updated_at').values('updated_at')[:1]),
+        review_count=Subquery(
+            reviews.order_by().values('product').annotate(c=Count('id')).values('c')
+        ),
+        last_purchase=Subquery(
+            PurchaseHistory.objects.filter(product=OuterRef('pk')).order_by('-id').values('id')[:1]
+        ),
+        # Offline jobs replace the neighbour rows, so new ids mean new content
+        last_recommendation=Subquery(
+            ProductRecommendation.objects.filter(product=OuterRef('pk')).order_by('-id').values('id')[:1]
+        ),
+    ).values('updated_at', 'last_review', 'review_count', 'last_purchase', 'last_recommendation').first()
+    if row is None:
+        return None
+    return ('product', product_id, row, catalogue_version())
+
+
+def search_validators(request):
+    return ('search', catalogue_version())
+
+
+def home_validators(request):
+    catalogue = catalogue_version()
+    site_reviews = SiteReview.objects.filter(is_approved=True).aggregate(
+        last_review=Max('created_at'), count=Count('id')
+    )
+    # Visitor counters only grow, so the newest row id is enough
+    last_visit = VisitorCounter.objects.aggregate(last_id=Max('id'))['last_id']
+    # Bestseller/trending lists move whenever update_rankings advances
+    rankings = RollupCheckpoint.objects.filter(name__startswith='rankings_').aggregate(Max('updated_at'))
+    return ('home', catalogue, site_reviews, last_visit, rankings, timezone.now().date())
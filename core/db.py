@@ -0,0 +1,82 @@
+import functools
+import random
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+
+from .routers import REPLICA_DB_ALIAS
+
+
+WRITE_RETRY_ATTEMPTS = 6
+WRITE_RETRY_BASE_DELAY = 0.02
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """``connection_created`` hook applying settings.SQLITE_PRAGMAS"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def backoff_delays(attempts=WRITE_RETRY_ATTEMPTS, base=WRITE_RETRY_BASE_DELAY):
+    """Exponential backoff with full jitter: base * 2**n, randomised"""
+    for attempt in range(attempts - 1):
+        yield random.uniform(0, base * (2 ** attempt))
+
+
+def write_transaction(func):
+    """
+    Run ``func`` in its own atomic block (``BEGIN IMMEDIATE`` under the
+    production profile) and retry it with backoff when SQLite reports the
+    database as locked. Inside an outer atomic block there is nothing safe
+    to retry, so errors propagate unchanged.
+    """
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        delays = backoff_delays()
+        while True:
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                delay = next(delays, None)
+                if not is_lock_error(e) or delay is None:
+                    raise
+                time.sleep(delay)
+    return inner
+
+
+def copy_database(path):
+    """
+    Copy the primary SQLite database to ``path`` with SQLite's online
+    backup API. The copy is a consistent snapshot and readers of the target
+    keep working while it runs (they wait on busy_timeout).
+    """
+    source = connections[DEFAULT_DB_ALIAS]
+    if source.vendor != 'sqlite':
+        raise ImproperlyConfigured('Only SQLite databases can be copied')
+    source.ensure_connection()
+    target = sqlite3.connect(str(path), timeout=20)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
+
+
+def refresh_replica(alias=REPLICA_DB_ALIAS):
+    copy_database(settings.DATABASES[alias]['NAME'])
@@ -0,0 +1,105 @@
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import PurchaseHistory, Review, VisitorCounter
+
+
+# dataset name -> (model, date field, exported columns)
+EXPORT_DATASETS = {
+    'purchases': (
+        PurchaseHistory, 'purchase_date',
+        ['id', 'product_id', 'product__name', 'user_id', 'session_key', 'quantity', 'purchase_date'],
+    ),
+    'reviews': (
+        Review, 'created_at',
+        ['id', 'product_id', 'product__name', 'reviewer_name', 'rating', 'comment', 'created_at'],
+    ),
+    'visitors': (
+        VisitorCounter, 'visit_date',
+        ['id', 'ip_address', 'user_agent', 'page_visited', 'visit_date'],
+    ),
+}
+EXPORT_FORMATS = ('csv', 'ndjson')
+KEYSET_BATCH_SIZE = 5000
+ITERATOR_CHUNK_SIZE = 1000
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _day_start(value, name):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        # Well formed but not a real day, e.g. 2024-02-30
+        raise ExportError(f'{name} is not a valid date: {value}.')
+    if day is None:
+        raise ExportError(f'{name} must be a date formatted YYYY-MM-DD.')
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def export_rows(dataset, start=None, end=None):
+    """
+    Yield ``(header, rows...)`` tuples for a dataset between two dates
+    (``end`` inclusive).
+
+    Rows are fetched in keyset batches on ``id`` so no single query or
+    cursor lives for the whole export, and each batch is streamed with
+    ``.iterator()`` so memory stays flat at any table size.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise ExportError(f'Unknown dataset "{dataset}".')
+    model, date_field, columns = EXPORT_DATASETS[dataset]
+
+    queryset = model.objects.order_by('id')
+    if start:
+        queryset = queryset.filter(**{f'{date_field}__gte': _day_start(start, 'start')})
+    if end:
+        end_exclusive = _day_start(end, 'end') + datetime.timedelta(days=1)
+        queryset = queryset.filter(**{f'{date_field}__lt': end_exclusive})
+
+    def generate():
+        yield tuple(columns)
+        last_id = 0
+        while True:
+            batch = queryset.filter(id__gt=last_id).values_list(*columns)[:KEYSET_BATCH_SIZE]
+            count = 0
+            for row in batch.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+                count += 1
+                last_id = row[0]
+                yield row
+            if count < KEYSET_BATCH_SIZE:
+                break
+
+    return generate()
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def encode_rows(rows, fmt):
+    """Turn the ``export_rows`` tuples into CSV or NDJSON text lines"""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f'Unknown format "{fmt}".')
+
+    def generate_csv():
+        writer = csv.writer(Echo())
+        for row in rows:
+            yield writer.writerow(row)
+
+    def generate_ndjson():
+        header = next(rows)
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+    return generate_csv() if fmt == 'csv' else generate_ndjson()
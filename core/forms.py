@@ -1,6 +1,51 @@
 from django import forms
 from .models import Product
 
+
+# Field rules shared by ProductForm and the CSV importer (core.importer)
+def clean_price_value(price):
+    if price is not None and price < 0:
+        raise forms.ValidationError('Price cannot be negative.')
+    return price
+
+
+def clean_stock_value(stock):
+    if stock is not None and stock < 0:
+        raise forms.ValidationError('Stock quantity cannot be negative.')
+    return stock
+
+
+def clean_discount_value(discount):
+    if discount is not None:
+        if discount < 0:
+            raise forms.ValidationError('Discount cannot be negative.')
+        if discount > 100:
+            raise forms.ValidationError('Discount percentage cannot exceed 100%.')
+    return discount
+
+
+def clean_name_value(name):
+    if name:
+        name = name.strip()
+        if len(name) < 2:
+            raise forms.ValidationError('Product name must be at least 2 characters long.')
+    return name
+
+
+def clean_category_value(category):
+    if category:
+        category = category.strip().title()  # Capitalize first letter of each word
+    return category
+
+
+def clean_description_value(description):
+    if description:
+        description = description.strip()
+        if len(description) < 10:
+            raise forms.ValidationError('Description must be at least 10 characters long.')
+    return description
+
+
 class ProductForm(forms.ModelForm):
     """
     Form for creating and editing products
@@ -86,47 +131,22 @@ class ProductForm(forms.ModelForm):
             self.fields['is_available'].initial = True
     
     def clean_price(self):
-        price = self.cleaned_data.get('price')
-        if price is not None and price < 0:
-            raise forms.ValidationError('Price cannot be negative.')
-        return price
+        return clean_price_value(self.cleaned_data.get('price'))
     
     def clean_stock(self):
-        stock = self.cleaned_data.get('stock')
-        if stock is not None and stock < 0:
-            raise forms.ValidationError('Stock quantity cannot be negative.')
-        return stock
+        return clean_stock_value(self.cleaned_data.get('stock'))
     
     def clean_discount(self):
-        discount = self.cleaned_data.get('discount')
-        if discount is not None:
-            if discount < 0:
-                raise forms.ValidationError('Discount cannot be negative.')
-            if discount > 100:
-                raise forms.ValidationError('Discount percentage cannot exceed 100%.')
-        return discount
+        return clean_discount_value(self.cleaned_data.get('discount'))
     
     def clean_name(self):
-        name = self.cleaned_data.get('name')
-        if name:
-            name = name.strip()
-            if len(name) < 2:
-                raise forms.ValidationError('Product name must be at least 2 characters long.')
-        return name
+        return clean_name_value(self.cleaned_data.get('name'))
     
     def clean_category(self):
-        category = self.cleaned_data.get('category')
-        if category:
-            category = category.strip().title()  # Capitalize first letter of each word
-        return category
+        return clean_category_value(self.cleaned_data.get('category'))
     
     def clean_description(self):
-        description = self.cleaned_data.get('description')
-        if description:
-            description = description.strip()
-            if len(description) < 10:
-                raise forms.ValidationError('Description must be at least 10 characters long.')
-        return description
+        return clean_description_value(self.cleaned_data.get('description'))
     
     def clean_image(self):
         image = self.cleaned_data.get('image')
@@ -0,0 +1,123 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .forms import (
+    ProductForm, clean_category_value, clean_description_value, clean_discount_value,
+    clean_name_value, clean_price_value, clean_stock_value,
+)
+from .models import Product
+from .product_cache import invalidate_product_cache
+
+
+IMPORT_COLUMNS = ['sku', 'name', 'category', 'price', 'stock', 'discount', 'description', 'is_available']
+REQUIRED_COLUMNS = ['sku', 'name', 'category', 'price', 'stock', 'description']
+REJECT_COLUMNS = ['line'] + IMPORT_COLUMNS + ['errors']
+# Columns overwritten when a row's sku already exists (created_at is kept)
+UPSERT_FIELDS = ['name', 'category', 'price', 'stock', 'discount', 'description', 'is_available', 'updated_at']
+DEFAULT_BATCH_SIZE = 1000
+
+VALUE_CLEANERS = {
+    'name': clean_name_value,
+    'category': clean_category_value,
+    'price': clean_price_value,
+    'stock': clean_stock_value,
+    'discount': clean_discount_value,
+    'description': clean_description_value,
+}
+
+
+def clean_product_row(row):
+    """
+    Validate one CSV row with the same field types and rules as
+    ProductForm, reusing the form's field objects instead of building a
+    form per row. Returns ``(values, errors)``.
+    """
+    form_fields = ProductForm.base_fields
+    sku_field = Product._meta.get_field('sku')
+    values = {}
+    errors = {}
+
+    sku = (row.get('sku') or '').strip()
+    if not sku:
+        errors['sku'] = ['This field is required.']
+    elif len(sku) > sku_field.max_length:
+        errors['sku'] = [f'Ensure this value has at most {sku_field.max_length} characters.']
+    else:
+        values['sku'] = sku
+
+    for name in IMPORT_COLUMNS[1:]:
+        raw = (row.get(name) or '').strip()
+        if name == 'is_available' and not raw:
+            values[name] = True
+            continue
+        try:
+            value = form_fields[name].clean(raw)
+            if name in VALUE_CLEANERS:
+                value = VALUE_CLEANERS[name](value)
+        except ValidationError as e:
+            errors[name] = e.messages
+        else:
+            values[name] = value
+    return values, errors
+
+
+def open_rejects_writer(handle):
+    writer = csv.DictWriter(handle, fieldnames=REJECT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    return writer
+
+
+def _upsert(batch):
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=UPSERT_FIELDS,
+        )
+        # bulk_create sends no post_save
+        invalidate_product_cache()
+    return len(batch)
+
+
+def import_products(lines, rejects, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Upsert products by ``sku`` from an iterable of CSV text lines.
+
+    Rows are parsed lazily and written with one ``bulk_create`` per batch,
+    so memory stays bounded by ``batch_size`` whatever the file size.
+    Invalid rows go to the ``rejects`` writer (see ``open_rejects_writer``).
+    Yields a progress dict after every batch and once more when done.
+    """
+    stats = {'processed': 0, 'imported': 0, 'rejected': 0, 'done': False}
+    reader = csv.DictReader(lines)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f'CSV is missing required columns: {", ".join(missing)}')
+
+    batch = {}
+    for row in reader:
+        stats['processed'] += 1
+        values, errors = clean_product_row(row)
+        if errors:
+            stats['rejected'] += 1
+            rejects.writerow(dict(
+                row,
+                line=reader.line_num,
+                errors='; '.join(f'{field}: {" ".join(messages)}' for field, messages in errors.items()),
+            ))
+            continue
+
+        # A later row for the same sku wins within a batch
+        batch[values['sku']] = Product(**values)
+        if len(batch) >= batch_size:
+            stats['imported'] += _upsert(list(batch.values()))
+            batch = {}
+            yield dict(stats)
+
+    if batch:
+        stats['imported'] += _upsert(list(batch.values()))
+    stats['done'] = True
+    yield dict(stats)
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db import copy_database
+from core.startup import LAZY_MODULES, MANAGE_CHECK, WSGI_LOAD, measure_imports, time_to_first_response
+
+
+class Command(BaseCommand):
+    help = ('Import-time breakdown of `manage.py check` and of loading the WSGI app, '
+            'and time from gunicorn start to the first response for /')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Rows per breakdown')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--no-server', action='store_true', help='Skip the time-to-first-response run')
+
+    def handle(self, *args, **options):
+        top = options['top']
+        for label, command in (('manage.py check', MANAGE_CHECK), ('WSGI app load', WSGI_LOAD)):
+            report = measure_imports(command)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{label}: {report.total_seconds * 1000:.0f} ms importing, {report.wall_seconds * 1000:.0f} ms wall'
+            ))
+            self.stdout.write('  by package (self time):')
+            for package, seconds in report.by_package()[:top]:
+                self.stdout.write(f'    {seconds * 1000:8.1f} ms  {package}')
+            self.stdout.write('  core modules (cumulative):')
+            for module, seconds in report.by_core_module()[:top]:
+                self.stdout.write(f'    {seconds * 1000:8.1f} ms  {module}')
+            if command is not WSGI_LOAD:
+                # check also runs the ImageField system check, which imports Pillow
+                continue
+            eager = [module for module in LAZY_MODULES if module in report.modules]
+            if eager:
+                self.stdout.write(self.style.WARNING(f"  imported although lazy: {', '.join(eager)}"))
+            if report.total_seconds > settings.STARTUP_BUDGET_SECONDS:
+                self.stdout.write(self.style.WARNING(
+                    f'  over the {settings.STARTUP_BUDGET_SECONDS:.2f}s startup budget'
+                ))
+
+        if options['no_server']:
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            # The server runs against a throwaway copy, never the real database
+            path = os.path.join(directory, 'startup.sqlite3')
+            copy_database(path)
+            env = dict(os.environ, SQLITE_PATH=path, CACHE_DIR=os.path.join(directory, 'cache'),
+                       PROMETHEUS_MULTIPROC_DIR=os.path.join(directory, 'metrics'))
+            env.pop('DATABASE_REPLICA', None)
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+                           cwd=settings.BASE_DIR, env=env, check=True)
+            try:
+                seconds = time_to_first_response(env, options['port'])
+            except RuntimeError as e:
+                raise CommandError(str(e))
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Time to first response for / after gunicorn start: {seconds * 1000:.0f} ms'
+        ))
@@ -0,0 +1,140 @@
+import http.client
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db import copy_database
+from core.models import Product
+
+
+# Application and gunicorn.conf.py profile of each server
+SERVERS = {
+    'wsgi': ('Dr_Ahmed.wsgi:application', 'wsgi'),
+    'asgi': ('Dr_Ahmed.asgi:application', 'asgi'),
+}
+
+
+def _wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/cart/info/')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise CommandError(f'Server on port {port} did not start')
+
+
+def _client(port, product_id, deadline, timings, errors):
+    """One visitor: a session of alternating add-to-cart and cart-info calls"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': 'application/json'}
+    body = json.dumps({'product_id': product_id, 'quantity': 1})
+    i = 0
+    while time.monotonic() < deadline:
+        method, path = ('POST', '/cart/add/') if i % 2 == 0 else ('GET', '/cart/info/')
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body if method == 'POST' else None, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            cookie = response.getheader('Set-Cookie')
+            if cookie and 'Cookie' not in headers:
+                headers['Cookie'] = cookie.split(';', 1)[0]
+        except OSError:
+            conn.close()
+            status = None
+        timings.append((time.perf_counter() - started) * 1000)
+        if status != 200:
+            errors.append(status)
+        i += 1
+    conn.close()
+
+
+def run_cart_benchmark(server, port, product_id, env, workers, concurrency, duration):
+    """Start gunicorn for ``server`` and drive it with ``concurrency`` visitors"""
+    application, profile = SERVERS[server]
+    command = [sys.executable, '-m', 'gunicorn', application,
+               '--bind', f'127.0.0.1:{port}', '--workers', str(workers)]
+    # Metric samples of this run only, never those of a server already running
+    metrics_dir = tempfile.mkdtemp(prefix='benchmark-metrics-')
+    env = dict(env, GUNICORN_PROFILE=profile, PROMETHEUS_MULTIPROC_DIR=metrics_dir)
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for_server(port)
+        timings, errors = [], []
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(target=_client, args=(port, product_id, deadline, timings, errors))
+            for _ in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    timings.sort()
+    return {
+        'server': server,
+        'requests': len(timings),
+        'errors': len(errors),
+        'requests_per_second': len(timings) / elapsed,
+        'p50': statistics.median(timings) if timings else 0,
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))] if timings else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent AJAX cart throughput under the WSGI and ASGI (uvicorn) gunicorn profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers for both servers')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 64],
+                            help='Concurrent visitors')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per run')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        product_id = Product.objects.filter(is_available=True).values_list('id', flat=True).first()
+        if product_id is None:
+            raise CommandError('Needs at least one available product')
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Both servers write to a throwaway copy, never to the real database
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            copy_database(path)
+            env = dict(os.environ, SQLITE_PATH=path, CACHE_DIR=os.path.join(directory, 'cache'))
+            env.pop('DATABASE_REPLICA', None)
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+                           cwd=settings.BASE_DIR, env=env, check=True)
+
+            self.stdout.write(f"{'server':<8}{'visitors':>9}{'requests':>10}{'errors':>8}"
+                              f"{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+            for concurrency in options['concurrency']:
+                for server in SERVERS:
+                    result = run_cart_benchmark(server, options['port'], product_id, env,
+                                                options['workers'], concurrency, options['duration'])
+                    self.stdout.write(
+                        f"{server:<8}{concurrency:>9}{result['requests']:>10}{result['errors']:>8}"
+                        f"{result['requests_per_second']:>9.0f}{result['p50']:>9.1f}{result['p95']:>9.1f}"
+                    )
@@ -0,0 +1,91 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from core.db import copy_database
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Compare the JSON catalogue API against the HTML catalogue pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Create this many throwaway products first (in the copy only)')
+        # Set on the re-run inside the copy
+        parser.add_argument('--in-copy', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if not options['in_copy']:
+            self.run_in_copy(options)
+            return
+
+        if options['seed']:
+            Product.objects.bulk_create(
+                Product(
+                    name=f'Benchmark product {i}',
+                    price=100 + i % 50,
+                    description='Benchmark product description',
+                    category=('Skin', 'Hair', 'Beauty')[i % 3],
+                    stock=i % 40,
+                )
+                for i in range(options['seed'])
+            )
+
+        targets = [
+            ('HTML home', '/'),
+            ('HTML search', '/search/?category=Skin'),
+            ('API list', '/api/products/'),
+            ('API list (category)', '/api/products/?category=Skin'),
+            ('API sparse fields', '/api/products/?fields=id,name,price'),
+        ]
+        self.stdout.write(f"{'endpoint':<22}{'mean ms':>10}{'p95 ms':>10}{'bytes':>10}{'queries':>9}")
+        for label, url in targets:
+            self.run_target(label, url, options['requests'])
+
+    def run_in_copy(self, options):
+        with tempfile.TemporaryDirectory() as directory:
+            # Seeded products, visitor rows and cache entries all stay in a
+            # throwaway copy and cache, never in the real database
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            copy_database(path)
+            env = dict(os.environ, SQLITE_PATH=path, CACHE_DIR=os.path.join(directory, 'cache'))
+            env.pop('DATABASE_REPLICA', None)
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+                           cwd=settings.BASE_DIR, env=env, check=True)
+            result = subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark_catalogue', '--in-copy',
+                 '--requests', str(options['requests']), '--seed', str(options['seed'])],
+                cwd=settings.BASE_DIR, env=env, check=True, stdout=subprocess.PIPE, text=True,
+            )
+        self.stdout.write(result.stdout, ending='')
+
+    def run_target(self, label, url, count):
+        client = Client(HTTP_HOST='localhost')
+        client.get(url)  # warm up
+        timings = []
+        size = queries = 0
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.get(url)
+                body = b''.join(response) if response.streaming else response.content
+                timings.append((time.perf_counter() - start) * 1000)
+            size = len(body)
+            queries = len(ctx.captured_queries)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{label:<22}{statistics.mean(timings):>10.2f}{p95:>10.2f}{size:>10}{queries:>9}'
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.recommendations import DEFAULT_TOP_K, build_also_bought
+
+
+class Command(BaseCommand):
+    help = 'Rebuild "customers also bought" neighbours from the purchase history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='Neighbours kept per product')
+        parser.add_argument('--metric', choices=['cosine', 'count'], default='cosine')
+        parser.add_argument('--min-support', type=int, default=1,
+                            help='Minimum number of shared baskets for a pair to count')
+
+    def handle(self, *args, **options):
+        written = build_also_bought(
+            top_k=options['top_k'],
+            metric=options['metric'],
+            min_support=options['min_support'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{written} recommendations written'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.recommendations import DEFAULT_TOP_K, build_similar
+
+
+class Command(BaseCommand):
+    help = 'Recompute content-based related products (TF-IDF over name, category and description)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='Neighbours kept per product')
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute every product instead of only those changed since the last run')
+
+    def handle(self, *args, **options):
+        rows, written = build_similar(top_k=options['top_k'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'{rows} products recomputed, {written} recommendations written'))
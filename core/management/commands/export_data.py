@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORT_DATASETS, EXPORT_FORMATS, ExportError, encode_rows, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream purchase history, reviews or visitor logs to CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_DATASETS))
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--start', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            lines = encode_rows(
+                export_rows(options['dataset'], options['start'], options['end']),
+                options['format'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+                handle.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
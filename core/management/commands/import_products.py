@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importer import DEFAULT_BATCH_SIZE, IMPORT_COLUMNS, import_products, open_rejects_writer
+
+
+class Command(BaseCommand):
+    help = 'Stream a product CSV into the catalogue, upserting by sku'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help=f'CSV with columns: {", ".join(IMPORT_COLUMNS)}')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--rejects', help='Where to write rejected rows (default: <csv>.rejected.csv)')
+
+    def handle(self, *args, **options):
+        source = Path(options['csv_path'])
+        if not source.is_file():
+            raise CommandError(f'{source} does not exist')
+        rejects_path = Path(options['rejects'] or source.with_suffix('.rejected.csv'))
+
+        with open(source, newline='', encoding='utf-8-sig') as lines, \
+                open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_file:
+            rejects = open_rejects_writer(rejects_file)
+            try:
+                for stats in import_products(lines, rejects, batch_size=options['batch_size']):
+                    self.stdout.write(
+                        f"{stats['processed']} rows read, {stats['imported']} imported, "
+                        f"{stats['rejected']} rejected"
+                    )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        if stats['rejected']:
+            self.stdout.write(self.style.WARNING(f'Rejected rows written to {rejects_path}'))
+        else:
+            rejects_path.unlink()
+        self.stdout.write(self.style.SUCCESS('Import finished'))
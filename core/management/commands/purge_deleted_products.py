@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.purge import PURGE_BATCH_SIZE, PURGE_PAUSE, deleted_product_ids, purge_product
+
+
+class Command(BaseCommand):
+    help = ('Remove soft-deleted products and their reviews, purchases and cart items in small batches, '
+            'once or every --interval seconds')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=PURGE_PAUSE, help='Seconds to sleep between batches')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and look for deleted products every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            for product_id in deleted_product_ids():
+                started = time.perf_counter()
+                rows = purge_product(product_id, options['batch_size'], options['pause'])
+                self.stdout.write(f'Product {product_id} purged with {rows} related rows '
+                                  f'in {time.perf_counter() - started:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.analytics import ROLLUP_BATCH_SIZE, rollup_daily_sales_batch
+
+
+class Command(BaseCommand):
+    help = 'Fold new PurchaseHistory rows into the ProductDailySales rollup, resuming from the last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            folded = rollup_daily_sales_batch(options['batch_size'])
+            if not folded:
+                break
+            total += folded
+            self.stdout.write(f'{total} purchases rolled up')
+        self.stdout.write(self.style.SUCCESS(f'Rollup up to date ({total} new purchases)'))
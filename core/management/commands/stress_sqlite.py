@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import backoff_delays, is_lock_error
+
+
+# Before: Django's stock SQLite behaviour (rollback journal, deferred BEGIN,
+# 5 s timeout, no retry). After: the production profile from settings.py.
+PROFILES = {
+    'default': {'pragmas': {'journal_mode': 'DELETE'}, 'begin': 'BEGIN', 'timeout': 5, 'retry': False},
+    'production': {'pragmas': None, 'begin': 'BEGIN IMMEDIATE', 'timeout': 20, 'retry': True},
+}
+
+
+def _worker(args):
+    path, profile_name, worker, writes = args
+    profile = PROFILES[profile_name]
+    pragmas = profile['pragmas'] if profile['pragmas'] is not None else settings.SQLITE_PRAGMAS
+    db = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None)
+    for name, value in pragmas.items():
+        db.execute(f'PRAGMA {name} = {value}')
+
+    done = errors = 0
+    for i in range(writes):
+        delays = backoff_delays() if profile['retry'] else iter(())
+        while True:
+            try:
+                # Same shape as record_visitor: look up, then insert
+                db.execute(profile['begin'])
+                db.execute('SELECT COUNT(*) FROM visits WHERE ip = ?', (f'10.0.{worker}.{i % 250}',)).fetchone()
+                db.execute('INSERT INTO visits (ip, agent) VALUES (?, ?)', (f'10.0.{worker}.{i % 250}', 'stress'))
+                db.execute('COMMIT')
+                done += 1
+                break
+            except sqlite3.OperationalError as e:
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+                delay = next(delays, None)
+                if not is_lock_error(e) or delay is None:
+                    errors += 1
+                    break
+                time.sleep(delay)
+    db.close()
+    return done, errors
+
+
+def run_write_stress(profile, workers=8, writes=200):
+    """Hammer a scratch SQLite file from ``workers`` processes; returns a result dict"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stress.sqlite3')
+        db = sqlite3.connect(path)
+        db.execute('CREATE TABLE visits (id INTEGER PRIMARY KEY, ip TEXT, agent TEXT)')
+        db.execute('CREATE INDEX visits_ip ON visits (ip)')
+        db.commit()
+        db.close()
+
+        started = time.perf_counter()
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_worker, [(path, profile, worker, writes) for worker in range(workers)])
+        elapsed = time.perf_counter() - started
+
+    done = sum(result[0] for result in results)
+    return {
+        'profile': profile,
+        'writes': done,
+        'errors': sum(result[1] for result in results),
+        'seconds': elapsed,
+        'writes_per_second': done / elapsed if elapsed else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent SQLite write throughput with the default and production profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent writer processes')
+        parser.add_argument('--writes', type=int, default=200, help='Writes per worker')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'profile':<12}{'writes':>8}{'locked':>8}{'seconds':>10}{'writes/s':>10}")
+        for profile in PROFILES:
+            result = run_write_stress(profile, options['workers'], options['writes'])
+            self.stdout.write(
+                f"{result['profile']:<12}{result['writes']:>8}{result['errors']:>8}"
+                f"{result['seconds']:>10.2f}{result['writes_per_second']:>10.0f}"
+            )
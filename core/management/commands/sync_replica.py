@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db import refresh_replica
+from core.routers import REPLICA_DB_ALIAS, replica_enabled
+
+
+class Command(BaseCommand):
+    help = 'Refresh the read replica from the primary SQLite database, once or every --interval seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and refresh every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        if not replica_enabled():
+            raise CommandError('No replica configured; set DATABASE_REPLICA to the replica file name')
+        replica = settings.DATABASES[REPLICA_DB_ALIAS]['NAME']
+        while True:
+            started = time.perf_counter()
+            refresh_replica(REPLICA_DB_ALIAS)
+            self.stdout.write(f'Replica {replica} refreshed in {time.perf_counter() - started:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
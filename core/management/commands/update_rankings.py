@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.rankings import RANKINGS_BATCH_SIZE, update_rankings
+
+
+class Command(BaseCommand):
+    help = 'Fold new purchases and reviews into the bestseller/trending rankings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=RANKINGS_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = update_rankings(options['batch_size'])
+            if not processed:
+                break
+            total += processed
+            self.stdout.write(f'{total} events folded in')
+        self.stdout.write(self.style.SUCCESS(f'Rankings up to date ({total} new events)'))
@@ -0,0 +1,150 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def media_etag(stat):
+    """Build a strong validator from file size and mtime (nginx style)"""
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    Parse a single ``bytes=start-end`` range.
+
+    Returns a ``(start, end)`` tuple (inclusive), ``None`` when the header
+    should be ignored and the full body sent, or ``False`` when the range
+    cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Multipart and malformed ranges fall back to a full response
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, last_modified):
+    """Check the If-Range precondition against the current validators"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload_response(full_path, path):
+    """
+    Hand the file over to the front-end server.
+
+    ``X-Sendfile`` (Apache, lighttpd) takes a filesystem path while
+    ``X-Accel-Redirect`` (nginx) takes an internal location URI.
+    """
+    header = settings.MEDIA_OFFLOAD_HEADER
+    response = HttpResponse()
+    # Percent-encoded: header values must be ASCII, and both servers decode
+    # the value before opening the file
+    if header.lower() == 'x-accel-redirect':
+        response[header] = quote(settings.MEDIA_ACCEL_REDIRECT_PREFIX + path.replace(os.sep, '/'))
+    else:
+        response[header] = quote(full_path)
+    # Let the front-end server pick the type and handle Range itself
+    del response['Content-Type']
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT with conditional GET and range support"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except (ValueError, SuspiciousFileOperation):
+        raise Http404('Invalid media path')
+
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag = media_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    if settings.MEDIA_OFFLOAD_HEADER:
+        response = _offload_response(full_path, path)
+    else:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        size = stat.st_size
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and _if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(range_header, size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % size
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _read_range(full_path, start, length),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+            response['Content-Length'] = str(length)
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'public, max-age=%d' % settings.MEDIA_CACHE_MAX_AGE
+    return response
@@ -0,0 +1,183 @@
+import importlib
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import Max
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+# Served in Prometheus text format at /metrics. Under gunicorn every worker
+# writes its samples to PROMETHEUS_MULTIPROC_DIR (the gunicorn configs set
+# it up) and a scrape sums them, so one scrape covers all workers. p99
+# alerts work off the histograms, e.g.
+#   histogram_quantile(0.99, sum by (le, view) (rate(http_request_duration_seconds_bucket[5m])))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_metrics_lock = threading.Lock()
+
+
+class LazyMetric:
+    """
+    A prometheus_client metric created on first use. Importing this module
+    (which every view does through the cart and product cache) then costs
+    nothing at boot; ``load_metrics()`` creates them all up front.
+    """
+
+    def __init__(self, kind, *args, **kwargs):
+        self._definition = (kind, args, kwargs)
+        self._metric = None
+
+    def load(self):
+        if self._metric is None:
+            with _metrics_lock:
+                if self._metric is None:
+                    kind, args, kwargs = self._definition
+                    self._metric = getattr(importlib.import_module('prometheus_client'), kind)(*args, **kwargs)
+        return self._metric
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+REQUEST_LATENCY = LazyMetric(
+    'Histogram', 'http_request_duration_seconds', 'Request latency by URL name', ['view', 'method'],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSES = LazyMetric('Counter', 'http_responses', 'Responses by URL name and status code', ['view', 'status'])
+DB_QUERIES = LazyMetric(
+    'Histogram', 'db_query_duration_seconds', 'Database query time by connection alias', ['alias'],
+    buckets=QUERY_BUCKETS,
+)
+SESSION_WRITES = LazyMetric('Counter', 'session_writes', 'Requests that saved their session')
+CART_MUTATIONS = LazyMetric('Counter', 'cart_mutations', 'Cart changes by action', ['action'])
+PRODUCT_CACHE = LazyMetric('Counter', 'product_cache_lookups', 'Product cache lookups by result', ['result'])
+PRODUCT_CACHE_EVICTIONS = LazyMetric('Counter', 'product_cache_evictions', 'Product cache LRU evictions')
+
+METRICS = (
+    REQUEST_LATENCY, RESPONSES, DB_QUERIES, SESSION_WRITES, CART_MUTATIONS, PRODUCT_CACHE, PRODUCT_CACHE_EVICTIONS,
+)
+
+
+def load_metrics():
+    """Create every metric now, e.g. in the gunicorn master before fork"""
+    for metric in METRICS:
+        metric.load()
+
+
+def _time_query(alias):
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            DB_QUERIES.labels(alias).observe(time.perf_counter() - started)
+    wrapper.metrics = True
+    return wrapper
+
+
+def install_query_metrics(connection, **kwargs):
+    """``connection_created`` receiver timing every query on the connection"""
+    if not any(getattr(wrapper, 'metrics', False) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(_time_query(connection.alias))
+
+
+class BacklogCollector:
+    """
+    Scrape-time gauges for the background jobs: events not yet folded in by
+    each checkpointed job, straight from the database.
+    """
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        from .models import PurchaseHistory, Review, RollupCheckpoint
+
+        sources = {
+            'product_daily_sales': PurchaseHistory,
+            'rankings_purchases': PurchaseHistory,
+            'rankings_reviews': Review,
+        }
+        checkpoints = dict(RollupCheckpoint.objects.filter(name__in=sources).values_list('name', 'last_id'))
+        gauge = GaugeMetricFamily('job_backlog_events', 'Rows newer than the job checkpoint', labels=['job'])
+        for name, model in sources.items():
+            newest = model.objects.aggregate(newest=Max('id'))['newest'] or 0
+            gauge.add_metric([name], max(newest - checkpoints.get(name, 0), 0))
+        yield gauge
+
+
+def metrics_registry():
+    """A registry for one scrape: every worker's samples plus the job backlog"""
+    from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+    registry = CollectorRegistry()
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        # A registry is itself a collector; the global one is never modified,
+        # so concurrent scrapes cannot trip over each other's registrations
+        registry.register(REGISTRY)
+    registry.register(BacklogCollector())
+    return registry
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of every worker's metrics, for scrapers
+    presenting METRICS_TOKEN or for logged-in staff
+    """
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = token and request.headers.get('Authorization') == f'Bearer {token}'
+    if not authorized and not request.user.is_staff:
+        return HttpResponseForbidden()
+    load_metrics()
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Request latency, status codes and session writes; first in MIDDLEWARE"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_metrics, dispatch_uid='core.metrics.queries')
+        for connection in connections.all(initialized_only=True):
+            install_query_metrics(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    def _observe(self, request, response, started):
+        match = request.resolver_match
+        # URL names keep the label set small; unmatched paths share one label
+        view = match.view_name if match else '<unmatched>'
+        method = request.method if request.method in KNOWN_METHODS else 'other'
+        REQUEST_LATENCY.labels(view, method).observe(time.perf_counter() - started)
+        RESPONSES.labels(view, str(response.status_code)).inc()
+        session = getattr(request, 'session', None)
+        if session is not None and session.modified:
+            SESSION_WRITES.inc()
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_product_sku'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchasehistory',
+            name='purchase_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='visitorcounter',
+            name='visit_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
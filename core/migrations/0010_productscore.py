@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_productdailysales_rollupcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductScore',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='core.product')),
+                ('units_sold', models.PositiveIntegerField(db_index=True, default=0)),
+                ('trending_score', models.FloatField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_productrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupcheckpoint',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='productrecommendation',
+            name='kind',
+            field=models.CharField(choices=[('also_bought', 'Customers also bought'), ('similar', 'Similar products')], max_length=20),
+        ),
+    ]
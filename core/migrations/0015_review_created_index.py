@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='core_review_created'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:10
+
+import django.db.models.expressions
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 0014 divided by the integer 100, which SQLite truncates for
+    # whole-number prices; rebuilding the column recomputes every row
+
+    dependencies = [
+        ('core', '0016_product_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(models.Case(models.When(discount__gt=0, then=models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('price'), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', models.F('discount'))), '/', models.Value(100.0)), output_field=models.DecimalField(decimal_places=2, max_digits=10))), default=models.F('price')), 2), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+    ]
@@ -1,9 +1,22 @@
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.db import models
+from django.db.models.functions import Round
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+class ProductManager(models.Manager):
+    """Default manager: soft-deleted products are gone everywhere at once"""
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
 
 # Create your models here.
 class Product(models.Model):
     name = models.CharField(max_length=100)
+    # Supplier stock-keeping unit, the natural key for CSV imports
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField()
     category = models.CharField(max_length=100)
@@ -11,17 +24,59 @@ class Product(models.Model):
     is_available = models.BooleanField(default=True)
     discount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    # The price customers pay, computed by the database from price and
+    # discount so every write path (forms, bulk edits, imports) keeps it in
+    # step; lets listings sort, filter and total by it in SQL
+    effective_price = models.GeneratedField(
+        expression=Round(
+            models.Case(
+                # 100.0, not 100: SQLite stores whole-number prices as integers
+                # and would otherwise divide them as integers (99 at 15% -> 84)
+                models.When(
+                    discount__gt=0,
+                    then=models.ExpressionWrapper(
+                        models.F('price') * (100 - models.F('discount')) / 100.0,
+                        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                ),
+                default=models.F('price'),
+            ),
+            2,
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    # Set by soft_delete(); purge_deleted_products later removes the row and
+    # its reviews, purchases and cart items in small batches
+    is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = ProductManager()
+    # Includes soft-deleted products, for the purge job
+    all_objects = models.Manager()
+    
+    class Meta:
+        indexes = [models.Index(fields=['is_available', 'effective_price'], name='core_product_available_price')]
     
     def __str__(self):
         return self.name
     
+    def soft_delete(self):
+        """Hide the product now, with one UPDATE, instead of cascading through its history"""
+        self.is_deleted = True
+        self.deleted_at = timezone.now()
+        # Frees the sku, so importing it again creates a new product
+        self.sku = None
+        self.save(update_fields=['is_deleted', 'deleted_at', 'sku', 'updated_at'])
+    
     def get_discounted_price(self):
+        """Same value as ``effective_price``, without needing a saved row"""
         if self.discount and self.discount > 0:
             # Calculate percentage discount
             discount_amount = (self.price * self.discount) / 100
-            return self.price - discount_amount
+            return (self.price - discount_amount).quantize(Decimal('0.01'), ROUND_HALF_UP)
         return self.price
     
     def get_discount_percentage(self):
@@ -41,7 +96,10 @@ class Cart(models.Model):
         return f"Anonymous Cart {self.session_key}"
     
     def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        total = self.items.aggregate(
+            total=models.Sum(models.F('quantity') * models.F('product__effective_price'))
+        )['total']
+        return (total or Decimal('0')).quantize(Decimal('0.01'))
     
     def get_total_items(self):
         return sum(item.quantity for item in self.items.all())
@@ -78,9 +136,19 @@ class Review(models.Model):
     rating = models.IntegerField(choices=RATING_CHOICES)
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Moves when a review is edited (e.g. in the admin), for the ETags
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a product's reviews on (created_at, id)
+            models.Index(fields=['product', 'created_at', 'id'], name='core_review_product_created'),
+            # Covers the review ETags' per-product count and latest change
+            models.Index(fields=['product', 'updated_at'], name='core_review_product_updated'),
+            # The admin's date hierarchy and newest-first changelist
+            models.Index(fields=['created_at'], name='core_review_created'),
+        ]
     
     def __str__(self):
         return f"{self.reviewer_name} - {self.rating} stars for {self.product.name}"
@@ -91,7 +159,7 @@ class PurchaseHistory(models.Model):
     session_key = models.CharField(max_length=40, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     quantity = models.PositiveIntegerField(default=1)
-    purchase_date = models.DateTimeField(auto_now_add=True)
+    purchase_date = models.DateTimeField(auto_now_add=True, db_index=True)
     
     class Meta:
         ordering = ['-purchase_date']
@@ -127,7 +195,7 @@ class SiteReview(models.Model):
 class VisitorCounter(models.Model):
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField(blank=True, null=True)
-    visit_date = models.DateTimeField(auto_now_add=True)
+    visit_date = models.DateTimeField(auto_now_add=True, db_index=True)
     page_visited = models.CharField(max_length=200, default='/')
     
     class Meta:
@@ -147,3 +215,72 @@ class VisitorCounter(models.Model):
         from django.utils import timezone
         today = timezone.now().date()
         return cls.objects.filter(visit_date__date=today).values('ip_address').distinct().count()
+
+
+class ProductDailySales(models.Model):
+    """Per-product, per-day sales rollup maintained by ``manage.py rollup_sales``"""
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    date = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    # Revenue at the discounted price in effect when the purchase was rolled up
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ('product', 'date')
+        indexes = [models.Index(fields=['date'])]
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.product_id} on {self.date}: {self.units} units"
+
+
+class ProductScore(models.Model):
+    """
+    Ranking counters maintained by ``manage.py update_rankings``.
+
+    ``trending_score`` is the log of the exponentially decayed activity
+    normalised to a fixed epoch (see ``core.rankings``), so it only ever
+    grows and can be compared across products without recomputation.
+    """
+    product = models.OneToOneField(Product, primary_key=True, related_name='score', on_delete=models.CASCADE)
+    units_sold = models.PositiveIntegerField(default=0, db_index=True)
+    trending_score = models.FloatField(null=True, blank=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.units_sold} sold"
+
+
+class ProductRecommendation(models.Model):
+    """Precomputed top-K neighbours of a product, rebuilt by offline jobs"""
+    ALSO_BOUGHT = 'also_bought'
+    SIMILAR = 'similar'
+    KIND_CHOICES = [
+        (ALSO_BOUGHT, 'Customers also bought'),
+        (SIMILAR, 'Similar products'),
+    ]
+    
+    product = models.ForeignKey(Product, related_name='recommendations', on_delete=models.CASCADE)
+    recommended = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        # Also the index behind the product page's single lookup
+        unique_together = ('product', 'kind', 'rank')
+        ordering = ['rank']
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.kind} #{self.rank})"
+
+
+class RollupCheckpoint(models.Model):
+    """Last source row id folded into a rollup, so jobs resume where they stopped"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    # For jobs that track changed rows by timestamp instead of id
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+
+from .metrics import PRODUCT_CACHE, PRODUCT_CACHE_EVICTIONS
+from .models import Product
+
+
+# Columns the cart endpoints, review submission and the product page read
+PRODUCT_CACHE_FIELDS = (
+    'id', 'name', 'price', 'discount', 'effective_price', 'category', 'description', 'stock', 'is_available',
+    'image',
+)
+LOCAL_CACHE_SIZE = 1024
+LOCAL_CACHE_TTL = 60
+SHARED_CACHE_TTL = 60 * 15
+# How long a worker trusts its copy of the version counter; this bounds
+# how stale other workers can be after an invalidation
+VERSION_CHECK_INTERVAL = 2
+
+VERSION_KEY = 'products:version'
+
+
+class ProductCache:
+    """
+    Two-tier product lookups: a per-worker LRU with TTL in front of the
+    shared cache, in front of the database. Every key carries the value of
+    a shared version counter, so bumping it invalidates both tiers at once.
+    """
+
+    def __init__(self, size=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def version(self):
+        now = time.monotonic()
+        if self._version_is_stale(now):
+            version = cache.get(VERSION_KEY)
+            if version is None:
+                # Not 1: a counter that restarts low could reach a version whose
+                # old entries are still in the shared cache
+                seed = int(time.time())
+                cache.add(VERSION_KEY, seed, None)
+                version = cache.get(VERSION_KEY, seed)
+            self._use_version(version, now)
+        return self._version
+
+    async def aversion(self):
+        now = time.monotonic()
+        if self._version_is_stale(now):
+            version = await cache.aget(VERSION_KEY)
+            if version is None:
+                seed = int(time.time())
+                await cache.aadd(VERSION_KEY, seed, None)
+                version = await cache.aget(VERSION_KEY, seed)
+            self._use_version(version, now)
+        return self._version
+
+    def _version_is_stale(self, now):
+        return self._version is None or now - self._version_checked > VERSION_CHECK_INTERVAL
+
+    def _use_version(self, version, now):
+        with self._lock:
+            if version != self._version:
+                # Entries filled under an older version can never be read again
+                self._entries.clear()
+            self._version = version
+            self._version_checked = now
+
+    def _get_local(self, product_id, now):
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(product_id)
+                self.stats['local_hits'] += 1
+                PRODUCT_CACHE.labels('local_hit').inc()
+                return entry[1]
+        return None
+
+    def get(self, product_id):
+        """The product with ``product_id``; raises Product.DoesNotExist"""
+        product_id = int(product_id)
+        version = self.version()
+        now = time.monotonic()
+        product = self._get_local(product_id, now)
+        if product is not None:
+            return product
+
+        key = f'products:v{version}:{product_id}'
+        product = cache.get(key)
+        if product is not None:
+            self.stats['shared_hits'] += 1
+            PRODUCT_CACHE.labels('shared_hit').inc()
+        else:
+            self.stats['misses'] += 1
+            PRODUCT_CACHE.labels('miss').inc()
+            # Shared by every session, so never filled from a replica that may lag
+            product = Product.objects.using(DEFAULT_DB_ALIAS).only(*PRODUCT_CACHE_FIELDS).get(pk=product_id)
+            cache.set(key, product, SHARED_CACHE_TTL)
+        self._store(product_id, product, now)
+        return product
+
+    async def aget(self, product_id):
+        """Async ``get`` for async views"""
+        product_id = int(product_id)
+        version = await self.aversion()
+        now = time.monotonic()
+        product = self._get_local(product_id, now)
+        if product is not None:
+            return product
+
+        key = f'products:v{version}:{product_id}'
+        product = await cache.aget(key)
+        if product is not None:
+            self.stats['shared_hits'] += 1
+            PRODUCT_CACHE.labels('shared_hit').inc()
+        else:
+            self.stats['misses'] += 1
+            PRODUCT_CACHE.labels('miss').inc()
+            product = await Product.objects.using(DEFAULT_DB_ALIAS).only(*PRODUCT_CACHE_FIELDS).aget(pk=product_id)
+            await cache.aset(key, product, SHARED_CACHE_TTL)
+        self._store(product_id, product, now)
+        return product
+
+    def _store(self, product_id, product, now):
+        with self._lock:
+            self._entries[product_id] = (now + self.ttl, product)
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+                PRODUCT_CACHE_EVICTIONS.inc()
+
+    def invalidate(self):
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            # Counter missing (evicted or never read): start a fresh one
+            version = int(time.time())
+            cache.set(VERSION_KEY, version, None)
+        self.stats['invalidations'] += 1
+        self._use_version(version, time.monotonic())
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._entries), capacity=self.size, version=self._version)
+
+
+product_cache = ProductCache()
+
+
+def get_product_or_404(product_id):
+    try:
+        return product_cache.get(product_id)
+    except (Product.DoesNotExist, TypeError, ValueError):
+        raise Http404('No Product matches the given query.')
+
+
+async def aget_product_or_404(product_id):
+    try:
+        return await product_cache.aget(product_id)
+    except (Product.DoesNotExist, TypeError, ValueError):
+        raise Http404('No Product matches the given query.')
+
+
+def invalidate_product_cache(**kwargs):
+    """
+    ``post_save``/``post_delete`` receiver, also called after bulk writes
+    that skip signals. Runs once the transaction commits so no worker can
+    refill the cache with rows from before the change.
+    """
+    transaction.on_commit(product_cache.invalidate)
@@ -0,0 +1,198 @@
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import base as template_base
+
+
+logger = logging.getLogger(__name__)
+
+# The profile of the request being served, if it is being profiled
+_current_profile = ContextVar('request_profile', default=None)
+
+FINGERPRINT_RES = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    # IN lists of any length share one fingerprint
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),
+]
+
+
+def fingerprint(sql):
+    for pattern, replacement in FINGERPRINT_RES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_ms = None
+        # fingerprint -> [count, total ms]
+        self.queries = defaultdict(lambda: [0, 0.0])
+        # template name -> [renders, total ms], including nested includes
+        self.templates = defaultdict(lambda: [0, 0.0])
+
+    @property
+    def sql_count(self):
+        return sum(count for count, _ in self.queries.values())
+
+    @property
+    def sql_ms(self):
+        return sum(ms for _, ms in self.queries.values())
+
+    @property
+    def template_ms(self):
+        # Includes are nested inside their parent, so only top-level renders add up
+        return self.templates.get(None, [0, 0.0])[1]
+
+    def server_timing(self, total_ms):
+        parts = [
+            f'sql;dur={self.sql_ms:.1f};desc="{self.sql_count} queries"',
+            f'tpl;dur={self.template_ms:.1f}',
+        ]
+        if self.view_ms is not None:
+            parts.append(f'view;dur={self.view_ms:.1f}')
+        parts.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(parts)
+
+    def top_queries(self, n):
+        return sorted(self.queries.items(), key=lambda item: -item[1][1])[:n]
+
+    def top_templates(self, n):
+        named = [item for item in self.templates.items() if item[0] is not None]
+        return sorted(named, key=lambda item: -item[1][1])[:n]
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        entry = profile.queries[fingerprint(sql)]
+        entry[0] += 1
+        entry[1] += (time.perf_counter() - started) * 1000
+
+
+def _install_query_recorder(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+_template_depth = ContextVar('template_depth', default=0)
+
+
+def _instrument_templates():
+    """Time every Template render, includes included"""
+    original = template_base.Template._render
+    if getattr(original, 'profiled', False):
+        return
+
+    def _render(self, context):
+        profile = _current_profile.get()
+        if profile is None:
+            return original(self, context)
+        depth = _template_depth.get()
+        token = _template_depth.set(depth + 1)
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            _template_depth.reset(token)
+            elapsed = (time.perf_counter() - started) * 1000
+            entry = profile.templates[self.origin.template_name or self.name or '<string>']
+            entry[0] += 1
+            entry[1] += elapsed
+            if depth == 0:
+                profile.templates[None][1] += elapsed
+
+    _render.profiled = True
+    template_base.Template._render = _render
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in (REQUEST_PROFILING) request instrumentation: SQL time and count
+    per query fingerprint, render time per template and view time, sent
+    back as a Server-Timing header. Slow requests are logged, sampled, with
+    their top queries and templates. When disabled the middleware removes
+    itself from the stack and nothing is patched.
+
+    Keep it near the top of MIDDLEWARE so the totals include the work of
+    the middleware below it. View time runs from process_view, after their
+    request phase, until the response is back here.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+        connection_created.connect(_install_query_recorder, dispatch_uid='core.profiling.queries')
+        for connection in connections.all(initialized_only=True):
+            _install_query_recorder(connection)
+        _instrument_templates()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self._finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self._finish(request, response, profile)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def _finish(self, request, response, profile):
+        now = time.perf_counter()
+        if profile.view_started is not None:
+            profile.view_ms = (now - profile.view_started) * 1000
+        total_ms = (now - profile.started) * 1000
+        response['Server-Timing'] = profile.server_timing(total_ms)
+
+        if total_ms >= settings.REQUEST_PROFILING_SLOW_MS and random.random() < settings.REQUEST_PROFILING_SAMPLE_RATE:
+            top_n = settings.REQUEST_PROFILING_TOP_N
+            lines = [
+                f'Slow request {request.method} {request.path} {response.status_code}: '
+                f'{profile.server_timing(total_ms)}'
+            ]
+            for sql, (count, ms) in profile.top_queries(top_n):
+                lines.append(f'  sql {ms:8.1f} ms {count:4}x  {sql[:300]}')
+            for name, (count, ms) in profile.top_templates(top_n):
+                lines.append(f'  tpl {ms:8.1f} ms {count:4}x  {name}')
+            logger.warning('\n'.join(lines))
+        return response
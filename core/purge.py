@@ -0,0 +1,57 @@
+import time
+
+from django.db import models
+
+from .db import write_transaction
+from .models import Product
+
+
+PURGE_BATCH_SIZE = 1000
+# Seconds between batches, so requests waiting for the write lock get it
+PURGE_PAUSE = 0.05
+
+
+def cascade_relations():
+    """Every relation whose rows a product's delete would cascade to"""
+    return [
+        relation for relation in Product._meta.get_fields(include_hidden=True)
+        if relation.auto_created and not relation.concrete and relation.on_delete is models.CASCADE
+    ]
+
+
+@write_transaction
+def _delete_batch(model, field_name, product_id, batch_size):
+    ids = list(
+        model._base_manager.filter(**{field_name: product_id}).values_list('pk', flat=True)[:batch_size]
+    )
+    if ids:
+        model._base_manager.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+@write_transaction
+def _delete_product(product_id):
+    # Only if it is still deleted; what is left to cascade is at most a few stragglers
+    return Product.all_objects.filter(pk=product_id, is_deleted=True).delete()[0]
+
+
+def purge_product(product_id, batch_size=PURGE_BATCH_SIZE, pause=PURGE_PAUSE):
+    """
+    Remove a soft-deleted product's related rows, ``batch_size`` at a time
+    and each batch in its own short transaction, then the product itself.
+    Returns the number of related rows deleted.
+    """
+    deleted = 0
+    for relation in cascade_relations():
+        while True:
+            count = _delete_batch(relation.related_model, relation.field.name, product_id, batch_size)
+            deleted += count
+            if count < batch_size:
+                break
+            time.sleep(pause)
+    _delete_product(product_id)
+    return deleted
+
+
+def deleted_product_ids():
+    return list(Product.all_objects.filter(is_deleted=True).order_by('deleted_at').values_list('id', flat=True))
@@ -0,0 +1,174 @@
+import datetime
+import math
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Product, ProductScore, PurchaseHistory, Review, RollupCheckpoint
+from .search import catalogue_generation
+
+
+RANKING_KINDS = ('bestsellers', 'trending')
+# Entries kept per cached list; pages show a prefix of it
+RANKING_SIZE = 24
+RANKING_CACHE_TIMEOUT = 60 * 10
+RANKINGS_BATCH_SIZE = 5000
+
+# Trending: every purchase/review counts ``weight * 2 ** (-age / half-life)``.
+# Scores are stored as log(sum(weight * 2 ** ((t - epoch) / half-life))),
+# which orders products exactly like the decayed score at any instant but
+# only ever grows, so updates never have to revisit old events.
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+REVIEW_WEIGHT = 2.0
+
+PURCHASES_CHECKPOINT = 'rankings_purchases'
+REVIEWS_CHECKPOINT = 'rankings_reviews'
+
+
+def decayed_log_weight(weight, when):
+    hours = (when - TRENDING_EPOCH).total_seconds() / 3600
+    return math.log(weight) + hours / TRENDING_HALF_LIFE_HOURS * math.log(2)
+
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without overflow; ``None`` stands for log(0)"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _score_field(kind):
+    if kind not in RANKING_KINDS:
+        raise ValueError(f'Unknown ranking "{kind}"')
+    return 'units_sold' if kind == 'bestsellers' else 'trending_score'
+
+
+def _cache_key(kind, category):
+    # Under the catalogue generation: a product that changes category, stops
+    # being available or is deleted must not keep its place in cached lists
+    return f'rankings:g{catalogue_generation()}:{kind}:{category.strip().lower()}'
+
+
+def _sort_ranking(entries):
+    entries.sort(key=lambda entry: (-entry[0], entry[1]))
+    return entries[:RANKING_SIZE]
+
+
+def build_ranking(kind, category=''):
+    """Rebuild one cached ``[(score, product_id), ...]`` list from ProductScore"""
+    field = _score_field(kind)
+    scores = ProductScore.objects.filter(product__is_available=True, product__is_deleted=False)
+    if kind == 'bestsellers':
+        scores = scores.filter(units_sold__gt=0)
+    else:
+        scores = scores.filter(trending_score__isnull=False)
+    if category:
+        scores = scores.filter(product__category__iexact=category.strip())
+    ranking = [
+        tuple(entry) for entry in
+        scores.order_by(f'-{field}', 'product_id').values_list(field, 'product_id')[:RANKING_SIZE]
+    ]
+    cache.set(_cache_key(kind, category), ranking, RANKING_CACHE_TIMEOUT)
+    return ranking
+
+
+def get_ranking(kind, category=''):
+    """Cached top list for a category ('' for the whole catalogue)"""
+    ranking = cache.get(_cache_key(kind, category))
+    if ranking is None:
+        ranking = build_ranking(kind, category)
+    return ranking
+
+
+def top_products(kind, category='', limit=8):
+    """Top ``limit`` available products of a ranking, hydrated in one query"""
+    ids = [product_id for _, product_id in get_ranking(kind, category)[:limit]]
+    products = Product.objects.filter(is_available=True).in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def units_sold(product_id):
+    """All-time units sold, as of the last ``update_rankings`` run"""
+    return ProductScore.objects.filter(product_id=product_id).values_list('units_sold', flat=True).first() or 0
+
+
+def _merge(kind, category, product_id, score):
+    """
+    Scores only grow, so an updated product either moves up inside the
+    cached list or enters it by beating the last entry; nothing else moves.
+    """
+    key = _cache_key(kind, category)
+    ranking = cache.get(key)
+    if ranking is None:
+        # Not cached here yet: the next read rebuilds it from the table
+        return
+    entries = [entry for entry in ranking if entry[1] != product_id]
+    entries.append((score, product_id))
+    cache.set(key, _sort_ranking(entries), RANKING_CACHE_TIMEOUT)
+
+
+def _fold(checkpoint_name, queryset, date_field, batch_size, touched, quantity_field=None):
+    """
+    Accumulate the next batch of events into ``touched`` as
+    ``product_id -> (units, log_score)`` and advance the checkpoint.
+    Purchases weigh their quantity, reviews ``REVIEW_WEIGHT``.
+    """
+    checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(name=checkpoint_name)
+    columns = ['id', 'product_id', date_field] + ([quantity_field] if quantity_field else [])
+    rows = list(queryset.filter(id__gt=checkpoint.last_id).order_by('id').values_list(*columns)[:batch_size])
+    for row in rows:
+        product_id, created = row[1], row[2]
+        quantity = row[3] if quantity_field else 0
+        weight = quantity if quantity_field else REVIEW_WEIGHT
+        units, log_score = touched.get(product_id, (0, None))
+        if weight > 0:
+            log_score = log_add(log_score, decayed_log_weight(weight, created))
+        touched[product_id] = (units + quantity, log_score)
+    if rows:
+        checkpoint.last_id = rows[-1][0]
+        checkpoint.save()
+    return len(rows)
+
+
+def update_rankings(batch_size=RANKINGS_BATCH_SIZE):
+    """
+    Fold new purchases and reviews into ProductScore and the cached lists.
+
+    Returns the number of events processed (0 when caught up).
+    """
+    touched = {}
+    with transaction.atomic():
+        processed = _fold(
+            PURCHASES_CHECKPOINT, PurchaseHistory.objects, 'purchase_date', batch_size, touched,
+            quantity_field='quantity',
+        )
+        processed += _fold(REVIEWS_CHECKPOINT, Review.objects, 'created_at', batch_size, touched)
+        if not touched:
+            return 0
+
+        scores = ProductScore.objects.in_bulk(list(touched))
+        new_scores = []
+        for product_id, (units, log_score) in touched.items():
+            score = scores.get(product_id)
+            if score is None:
+                new_scores.append(ProductScore(product_id=product_id, units_sold=units, trending_score=log_score))
+            else:
+                score.units_sold += units
+                score.trending_score = log_add(score.trending_score, log_score)
+        ProductScore.objects.bulk_update(list(scores.values()), ['units_sold', 'trending_score'], batch_size=500)
+        ProductScore.objects.bulk_create(new_scores, batch_size=500)
+
+    current = ProductScore.objects.filter(
+        product_id__in=list(touched), product__is_available=True, product__is_deleted=False
+    ).values_list('product_id', 'units_sold', 'trending_score', 'product__category')
+    for product_id, units_sold, trending_score, category in current:
+        for scope in ('', category):
+            if units_sold:
+                _merge('bestsellers', scope, product_id, units_sold)
+            if trending_score is not None:
+                _merge('trending', scope, product_id, trending_score)
+    return processed
@@ -0,0 +1,284 @@
+import re
+from array import array
+
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import Product, ProductRecommendation, PurchaseHistory, RollupCheckpoint
+
+
+DEFAULT_TOP_K = 8
+WRITE_BATCH_SIZE = 1000
+SIMILAR_CHECKPOINT = 'similar_products'
+
+# Text fields and how many times their tokens count
+TFIDF_FIELDS = {'name': 2, 'category': 2, 'description': 1}
+TOKEN_RE = re.compile(r'[^\W_]{2,}')
+# Arabic harakat and tatweel, and letter variants folded to one form
+ARABIC_MARKS_RE = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u0640]')
+ARABIC_FOLDING = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ة': 'ه', 'ؤ': 'و', 'ئ': 'ي'})
+
+
+def recommended_products(product, kind, limit=DEFAULT_TOP_K):
+    """Precomputed neighbours of ``product``, in one indexed query"""
+    rows = (
+        ProductRecommendation.objects
+        .filter(product=product, kind=kind, recommended__is_available=True, recommended__is_deleted=False)
+        .select_related('recommended')
+        .order_by('rank')[:limit]
+    )
+    return [row.recommended for row in rows]
+
+
+def top_k_neighbours(similarity, k):
+    """
+    Yield ``(row, [(column, score), ...])`` with the ``k`` largest entries
+    of every non-empty row of a CSR matrix, best first.
+    """
+    import numpy as np
+
+    indptr, indices, data = similarity.indptr, similarity.indices, similarity.data
+    for row in range(similarity.shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        row_data = data[start:end]
+        if end - start > k:
+            top = np.argpartition(-row_data, k)[:k]
+        else:
+            top = np.arange(end - start)
+        top = top[np.argsort(-row_data[top], kind='stable')]
+        yield row, [(int(indices[start + i]), float(row_data[i])) for i in top]
+
+
+def replace_recommendations(kind, neighbours, row_ids, column_ids, only_rows=False):
+    """
+    Write ``neighbours`` (as yielded by ``top_k_neighbours``) for ``kind``
+    in one transaction. Row and column indexes map to product ids through
+    ``row_ids`` and ``column_ids``. By default the whole table for ``kind``
+    is replaced; with ``only_rows`` just the products in ``row_ids``.
+    """
+    written = 0
+    with transaction.atomic():
+        existing = ProductRecommendation.objects.filter(kind=kind)
+        if only_rows:
+            for start in range(0, len(row_ids), WRITE_BATCH_SIZE):
+                existing.filter(product_id__in=row_ids[start:start + WRITE_BATCH_SIZE]).delete()
+        else:
+            existing.delete()
+        batch = []
+        for row, items in neighbours:
+            for rank, (column, score) in enumerate(items, start=1):
+                batch.append(ProductRecommendation(
+                    product_id=row_ids[row],
+                    recommended_id=column_ids[column],
+                    kind=kind,
+                    rank=rank,
+                    score=score,
+                ))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                ProductRecommendation.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        ProductRecommendation.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def build_also_bought(top_k=DEFAULT_TOP_K, metric='cosine', min_support=1):
+    """
+    Rebuild the "customers also bought" table from PurchaseHistory.
+
+    Baskets are users (or anonymous sessions). With ``X`` the binary
+    basket x product matrix, ``X.T @ X`` counts how many baskets hold each
+    pair of products; ``cosine`` divides by sqrt(n_i * n_j) so very popular
+    products do not crowd out everything else. Returns the rows written.
+    """
+    # Heavy numeric imports stay out of the web workers
+    import numpy as np
+    from scipy import sparse
+
+    baskets = {}
+    products = {}
+    basket_codes = array('q')
+    product_codes = array('q')
+    purchases = (
+        PurchaseHistory.objects
+        .filter(Q(user__isnull=False) | Q(session_key__isnull=False))
+        .order_by()
+        .values_list('user_id', 'session_key', 'product_id')
+        .iterator(chunk_size=5000)
+    )
+    for user_id, session_key, product_id in purchases:
+        basket = ('user', user_id) if user_id else ('session', session_key)
+        basket_codes.append(baskets.setdefault(basket, len(baskets)))
+        product_codes.append(products.setdefault(product_id, len(products)))
+
+    product_ids = [None] * len(products)
+    for product_id, index in products.items():
+        product_ids[index] = product_id
+    if not product_ids:
+        return replace_recommendations(ProductRecommendation.ALSO_BOUGHT, [], product_ids, product_ids)
+
+    incidence = sparse.csr_matrix(
+        (
+            np.ones(len(basket_codes), dtype=np.float32),
+            (np.frombuffer(basket_codes, dtype=np.int64), np.frombuffer(product_codes, dtype=np.int64)),
+        ),
+        shape=(len(baskets), len(products)),
+    )
+    # Repeat purchases in one basket count once
+    incidence.data[:] = 1
+
+    cooccurrence = (incidence.T @ incidence).tocsr()
+    basket_counts = cooccurrence.diagonal()
+    cooccurrence.setdiag(0)
+    if min_support > 1:
+        cooccurrence.data[cooccurrence.data < min_support] = 0
+    cooccurrence.eliminate_zeros()
+
+    if metric == 'cosine':
+        scale = sparse.diags(1 / np.sqrt(basket_counts))
+        similarity = (scale @ cooccurrence @ scale).tocsr()
+    else:
+        similarity = cooccurrence
+
+    return replace_recommendations(
+        ProductRecommendation.ALSO_BOUGHT,
+        top_k_neighbours(similarity, top_k),
+        product_ids,
+        product_ids,
+    )
+
+
+def tokenize(text):
+    """Lower-cased English and normalised Arabic word tokens"""
+    text = ARABIC_MARKS_RE.sub('', (text or '').lower()).translate(ARABIC_FOLDING)
+    return TOKEN_RE.findall(text)
+
+
+def tfidf_matrix():
+    """
+    Build L2-normalised TF-IDF rows (sublinear tf, smoothed idf) for every
+    product. Returns ``(product_ids, matrix)``.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    vocabulary = {}
+    product_ids = []
+    rows = array('q')
+    columns = array('q')
+    weights = array('d')
+    products = Product.objects.order_by('id').values_list('id', *TFIDF_FIELDS).iterator(chunk_size=2000)
+    for row in products:
+        index = len(product_ids)
+        product_ids.append(row[0])
+        for text, weight in zip(row[1:], TFIDF_FIELDS.values()):
+            for token in tokenize(text):
+                rows.append(index)
+                columns.append(vocabulary.setdefault(token, len(vocabulary)))
+                weights.append(weight)
+
+    shape = (len(product_ids), max(len(vocabulary), 1))
+    # Duplicate (row, column) pairs are summed into term counts
+    counts = sparse.csr_matrix(
+        (
+            np.frombuffer(weights, dtype=np.float64),
+            (np.frombuffer(rows, dtype=np.int64), np.frombuffer(columns, dtype=np.int64)),
+        ),
+        shape=shape,
+    )
+    counts.data = 1 + np.log(counts.data)
+    document_frequency = np.bincount(counts.indices, minlength=shape[1])
+    idf = np.log((1 + shape[0]) / (1 + document_frequency)) + 1
+    weighted = (counts @ sparse.diags(idf)).tocsr()
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return product_ids, (sparse.diags(1 / norms) @ weighted).tocsr()
+
+
+def _rows_to_refresh(product_ids, matrix, since, top_k=DEFAULT_TOP_K):
+    """
+    Products changed since ``since`` plus the unchanged products whose
+    ``top_k`` neighbour lists they can enter or leave.
+    """
+    index = {product_id: i for i, product_id in enumerate(product_ids)}
+    changed_ids = [
+        product_id for product_id in
+        Product.objects.filter(updated_at__gt=since).values_list('id', flat=True)
+        if product_id in index
+    ]
+    if not changed_ids:
+        return []
+    changed = [index[product_id] for product_id in changed_ids]
+
+    # Similarity of every product to each changed one
+    best_to_changed = (matrix[changed] @ matrix.T).max(axis=0).toarray().ravel()
+    current = {
+        row['product_id']: row
+        for row in ProductRecommendation.objects.filter(kind=ProductRecommendation.SIMILAR)
+        .values('product_id').annotate(lowest=Min('score'), count=Count('id'))
+    }
+    listing_changed = set(
+        ProductRecommendation.objects.filter(kind=ProductRecommendation.SIMILAR, recommended_id__in=changed_ids)
+        .values_list('product_id', flat=True)
+    )
+
+    refresh = set(changed)
+    for product_id, i in index.items():
+        if i in refresh:
+            continue
+        entry = current.get(product_id)
+        if (
+            product_id in listing_changed
+            or (best_to_changed[i] > 0 and (entry is None or entry['count'] < top_k
+                                            or best_to_changed[i] > entry['lowest']))
+        ):
+            refresh.add(i)
+    return sorted(refresh)
+
+
+def build_similar(top_k=DEFAULT_TOP_K, full=False):
+    """
+    Recompute content-based neighbours from TF-IDF cosine similarity.
+
+    Incremental runs only recompute rows for products whose ``updated_at``
+    moved since the previous run and for the products they affect; IDF
+    weights of untouched rows are refreshed on the next ``full`` run.
+    Returns ``(rows_recomputed, recommendations_written)``.
+    """
+    started = timezone.now()
+    checkpoint, _ = RollupCheckpoint.objects.get_or_create(name=SIMILAR_CHECKPOINT)
+    product_ids, matrix = tfidf_matrix()
+
+    if full or checkpoint.last_seen_at is None:
+        rows = list(range(len(product_ids)))
+    else:
+        rows = _rows_to_refresh(product_ids, matrix, checkpoint.last_seen_at, top_k)
+
+    written = 0
+    if rows:
+        import numpy as np
+        from scipy import sparse
+
+        similarity = (matrix[rows] @ matrix.T).tocoo()
+        # Drop each product's similarity with itself
+        keep = similarity.col != np.asarray(rows)[similarity.row]
+        similarity = sparse.csr_matrix(
+            (similarity.data[keep], (similarity.row[keep], similarity.col[keep])),
+            shape=similarity.shape,
+        )
+        row_ids = [product_ids[i] for i in rows]
+        written = replace_recommendations(
+            ProductRecommendation.SIMILAR,
+            top_k_neighbours(similarity, top_k),
+            row_ids,
+            product_ids,
+            only_rows=not (full or checkpoint.last_seen_at is None),
+        )
+
+    checkpoint.last_seen_at = started
+    checkpoint.save()
+    return len(rows), written
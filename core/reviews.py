@@ -0,0 +1,75 @@
+import base64
+import json
+
+from django.db.models import Avg, Count, Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Review
+
+
+REVIEWS_PAGE_SIZE = 10
+MAX_REVIEWS_PAGE_SIZE = 50
+REVIEW_FIELDS = ('id', 'reviewer_name', 'rating', 'comment', 'created_at')
+
+
+class ReviewQueryError(ValueError):
+    pass
+
+
+def encode_review_cursor(review):
+    position = {'t': review['created_at'].isoformat(), 'id': review['id']}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_review_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+        created_at = parse_datetime(position['t'])
+        if created_at is None:
+            raise ValueError
+        return created_at, int(position['id'])
+    except (ValueError, KeyError, TypeError):
+        raise ReviewQueryError('Invalid cursor.')
+
+
+def parse_ratings(raw):
+    """``'4,5'`` -> ``[4, 5]``; empty means every rating"""
+    if not raw:
+        return None
+    try:
+        ratings = sorted({int(value) for value in raw.split(',')})
+    except ValueError:
+        raise ReviewQueryError('Invalid rating filter.')
+    if not all(1 <= rating <= 5 for rating in ratings):
+        raise ReviewQueryError('Ratings must be between 1 and 5.')
+    return ratings
+
+
+def review_page(product_id, cursor=None, ratings=None, min_rating=None, limit=REVIEWS_PAGE_SIZE):
+    """
+    One page of a product's reviews, newest first, and the cursor of the
+    next page (``None`` on the last one). Pages seek on (created_at, id)
+    through the (product, created_at, id) index instead of using OFFSET.
+    """
+    reviews = Review.objects.filter(product_id=product_id)
+    if ratings:
+        reviews = reviews.filter(rating__in=ratings)
+    if min_rating:
+        reviews = reviews.filter(rating__gte=min_rating)
+    if cursor:
+        created_at, review_id = decode_review_cursor(cursor)
+        reviews = reviews.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=review_id))
+
+    rows = list(reviews.order_by('-created_at', '-id').values(*REVIEW_FIELDS)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_review_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def review_summary(product_id):
+    """Average rating (one decimal) and review count from one aggregate"""
+    stats = Review.objects.filter(product_id=product_id).aggregate(avg=Avg('rating'), count=Count('id'))
+    return (round(stats['avg'], 1) if stats['count'] else 0), stats['count']
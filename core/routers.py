@@ -0,0 +1,115 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_DB_ALIAS = 'replica'
+REPLICA_PIN_SESSION_KEY = '_db_primary_until'
+
+# Catalogue and analytics tables; carts, sessions and auth stay on the primary
+REPLICA_MODELS = {
+    'core.product',
+    'core.review',
+    'core.sitereview',
+    'core.purchasehistory',
+    'core.visitorcounter',
+    'core.productdailysales',
+    'core.productscore',
+    'core.productrecommendation',
+    'core.rollupcheckpoint',
+}
+# Writes nobody needs to read back straight away do not pin the session
+STICKY_EXEMPT_MODELS = {'core.visitorcounter'}
+
+# Per-request routing state, set by ReplicaRoutingMiddleware. Outside a
+# request (management commands, background jobs) everything uses the primary.
+_request_state = ContextVar('db_request_state', default=None)
+
+
+def replica_enabled():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    """
+    Catalogue and analytics reads go to the replica, everything else and
+    all writes to the primary. After a write the request, and the session
+    for REPLICA_STICKY_SECONDS, read from the primary so users see their
+    own changes before the next replica sync.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not replica_enabled() or model._meta.label_lower not in REPLICA_MODELS:
+            return None
+        state = _request_state.get()
+        if state is None or state['pinned']:
+            return None
+        # Reads inside a primary transaction must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        label = model._meta.label_lower
+        state = _request_state.get()
+        if state is not None and label in REPLICA_MODELS and label not in STICKY_EXEMPT_MODELS:
+            state['pinned'] = state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so rows relate across both
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema with the data from sync_replica
+        return db != REPLICA_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Tracks writes per request and keeps the session on the primary after one"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not replica_enabled():
+            return self.get_response(request)
+
+        state = _new_state(request.session.get(REPLICA_PIN_SESSION_KEY, 0))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state['wrote']:
+            request.session[REPLICA_PIN_SESSION_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+        return response
+
+    async def __acall__(self, request):
+        if not replica_enabled():
+            return await self.get_response(request)
+
+        state = _new_state(await request.session.aget(REPLICA_PIN_SESSION_KEY, 0))
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state['wrote']:
+            await request.session.aset(REPLICA_PIN_SESSION_KEY, time.time() + settings.REPLICA_STICKY_SECONDS)
+        return response
+
+
+def _new_state(pinned_until):
+    return {'pinned': pinned_until > time.time(), 'wrote': False}
@@ -0,0 +1,157 @@
+import hashlib
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Q
+
+from .models import Product
+from .product_cache import product_cache
+
+
+SEARCH_PAGE_SIZE = 12
+SEARCH_CACHE_TTL = 60 * 10
+
+# Discounted-price facet, in IQD: (key, lower bound, upper bound), lower
+# bound inclusive. The key is what ?price= takes.
+PRICE_BUCKETS = (
+    ('0-10', None, Decimal('10')),
+    ('10-25', Decimal('10'), Decimal('25')),
+    ('25-50', Decimal('25'), Decimal('50')),
+    ('50-100', Decimal('50'), Decimal('100')),
+    ('100-', Decimal('100'), None),
+)
+PRICE_BUCKET_KEYS = {key for key, _, _ in PRICE_BUCKETS}
+
+# ?sort= values; the first is the default. Ties break on id so pages never overlap
+SEARCH_SORTS = {
+    'newest': ('-created_at', '-id'),
+    'price': ('effective_price', 'id'),
+    '-price': ('-effective_price', '-id'),
+}
+
+
+def catalogue_generation():
+    """
+    Bumped on every Product change (signals, bulk edits and imports), so
+    keys that carry it never need to be found and deleted.
+    """
+    return product_cache.version()
+
+
+def normalize_query(query):
+    # SQLite LIKE ignores case only for ASCII, so only then do "Shoes" and
+    # "shoes" share results
+    query = query.strip()
+    return query.lower() if query.isascii() else query
+
+
+def normalize_page(page_number):
+    """The page ``Paginator.get_page`` would serve, for keying the cache"""
+    if page_number == 'last':
+        return page_number
+    try:
+        return int(page_number)
+    except (TypeError, ValueError):
+        return 1
+
+
+def normalize_price(price):
+    """A ``PRICE_BUCKETS`` key, or ``''`` for anything else"""
+    return price if price in PRICE_BUCKET_KEYS else ''
+
+
+def normalize_sort(sort):
+    return sort if sort in SEARCH_SORTS else 'newest'
+
+
+def price_filter(price):
+    """Condition for the discounted price being in bucket ``price``"""
+    condition = Q()
+    for key, low, high in PRICE_BUCKETS:
+        if key == price:
+            if low is not None:
+                condition &= Q(effective_price__gte=low)
+            if high is not None:
+                condition &= Q(effective_price__lt=high)
+    return condition
+
+
+def search_queryset(query, category='', price=''):
+    # Results go into the shared cache under the current generation, so they
+    # must not come from a replica that has not caught up with it yet
+    products = Product.objects.using(DEFAULT_DB_ALIAS).filter(is_available=True)
+    if query:
+        products = products.filter(
+            Q(name__icontains=query) |
+            Q(category__icontains=query) |
+            Q(description__icontains=query)
+        )
+    if category:
+        products = products.filter(category__icontains=category)
+    if price:
+        products = products.filter(price_filter(price))
+    return products
+
+
+def _search_key(generation, *parts):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'search:g{generation}:{digest}'
+
+
+def search_page(query, category, page_number, price='', sort='newest'):
+    """
+    The ``Page`` of products for a search, in ``SEARCH_SORTS`` order. The
+    shared cache keeps only each page's product ids and the result count;
+    the products themselves are loaded with one ``id__in`` query.
+    """
+    query, page_number = normalize_query(query), normalize_page(page_number)
+    price, sort = normalize_price(price), normalize_sort(sort)
+    key = _search_key(catalogue_generation(), 'page', query, category, price, sort, page_number)
+    result = cache.get(key)
+    if result is None:
+        products = search_queryset(query, category, price).order_by(*SEARCH_SORTS[sort])
+        ids = products.values_list('id', flat=True)
+        page = Paginator(ids, SEARCH_PAGE_SIZE).get_page(page_number)
+        result = {'ids': list(page.object_list), 'number': page.number, 'total': page.paginator.count}
+        cache.set(key, result, SEARCH_CACHE_TTL)
+
+    # Page arithmetic needs only the count; swap in the real products after
+    page = Paginator(range(result['total']), SEARCH_PAGE_SIZE).page(result['number'])
+    products = Product.objects.in_bulk(result['ids'])
+    page.object_list = [products[product_id] for product_id in result['ids'] if product_id in products]
+    return page
+
+
+def search_facets(query, category='', price=''):
+    """
+    Category counts and discounted-price bucket counts for a search, each
+    facet ignoring its own filter so the other choices stay visible. One
+    grouped query computes both: per category, the matches in the selected
+    price bucket and the matches of every bucket in the selected category.
+    """
+    query, price = normalize_query(query), normalize_price(price)
+    key = _search_key(catalogue_generation(), 'facets', query, category, price)
+    facets = cache.get(key)
+    if facets is not None:
+        return facets
+
+    in_category = Q(category__icontains=category) if category else Q()
+    aggregates = {'in_price': Count('id', filter=price_filter(price) or None)}
+    for i, (bucket, _, _) in enumerate(PRICE_BUCKETS):
+        aggregates[f'bucket_{i}'] = Count('id', filter=in_category & price_filter(bucket))
+    rows = search_queryset(query).order_by('category').values('category').annotate(**aggregates)
+
+    categories, prices = [], [0] * len(PRICE_BUCKETS)
+    for row in rows:
+        if row['in_price'] or row['category'] == category:
+            categories.append((row['category'], row['in_price']))
+        for i in range(len(PRICE_BUCKETS)):
+            prices[i] += row[f'bucket_{i}']
+    facets = {
+        'categories': categories,
+        'prices': [(bucket, low, high, count) for (bucket, low, high), count in zip(PRICE_BUCKETS, prices)],
+    }
+    cache.set(key, facets, SEARCH_CACHE_TTL)
+    return facets
@@ -0,0 +1,106 @@
+import http.client
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+
+# What a worker imports before serving: the WSGI app and the URLconf its
+# first request resolves against
+WSGI_LOAD = ['-c', 'import Dr_Ahmed.wsgi, Dr_Ahmed.urls']
+MANAGE_CHECK = ['manage.py', 'check']
+
+# Heavy modules only some pages need; loading the app must not import them
+LAZY_MODULES = (
+    'numpy', 'scipy', 'PIL', 'prometheus_client',
+    'core.forms', 'core.exports', 'core.importer', 'core.bulk',
+)
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+
+class ImportTime:
+    """``python -X importtime`` output of one command, times in seconds"""
+
+    def __init__(self, entries, wall_seconds=None):
+        # (module, self seconds, cumulative seconds, nesting depth)
+        self.entries = entries
+        self.wall_seconds = wall_seconds
+
+    @property
+    def modules(self):
+        return {module for module, _, _, _ in self.entries}
+
+    @property
+    def total_seconds(self):
+        # Cumulative times of top-level imports cover every nested one
+        return sum(cumulative for _, _, cumulative, depth in self.entries if depth == 0)
+
+    def by_package(self):
+        """Self time per top-level package, slowest first"""
+        totals = defaultdict(float)
+        for module, own, _, _ in self.entries:
+            totals[module.split('.', 1)[0]] += own
+        return sorted(totals.items(), key=lambda item: -item[1])
+
+    def by_core_module(self):
+        """Cumulative time of each ``core`` module, slowest first"""
+        rows = [(module, cumulative) for module, _, cumulative, _ in self.entries
+                if module == 'core' or module.startswith('core.')]
+        return sorted(rows, key=lambda item: -item[1])
+
+
+def parse_importtime(output):
+    entries = []
+    for line in output.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            # Each nesting level indents the module name by two spaces
+            entries.append((module, int(own) / 1e6, int(cumulative) / 1e6, (len(indent) - 1) // 2))
+    return ImportTime(entries)
+
+
+def measure_imports(args, env=None):
+    """Run ``python -X importtime <args>`` in a fresh interpreter and parse it"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=settings.BASE_DIR,
+                            env=env or os.environ, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - started
+    if result.returncode:
+        raise RuntimeError(f'{" ".join(args)} failed:\n{result.stderr[-2000:]}')
+    report = parse_importtime(result.stderr)
+    report.wall_seconds = wall_seconds
+    return report
+
+
+def time_to_first_response(env, port, path='/', timeout=60):
+    """
+    Seconds from starting gunicorn (one worker, gunicorn.conf.py as in
+    production, warm-up included) to the first 200 for ``path``.
+    """
+    command = [sys.executable, '-m', 'gunicorn', 'Dr_Ahmed.wsgi:application',
+               '--bind', f'127.0.0.1:{port}', '--workers', '1']
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+                conn.request('GET', path)
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - started
+            except OSError:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited before answering')
+            time.sleep(0.02)
+        raise RuntimeError(f'No 200 for {path} within {timeout}s')
+    finally:
+        process.terminate()
+        process.wait()
@@ -1,3 +1,1012 @@
-from django.test import TestCase
+import datetime
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.parse import unquote
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import path, resolve
+from django.utils import timezone
+
+from . import views
+from .admin import EstimatedCountPaginator
+from .analytics import DAILY_SALES_CHECKPOINT, rollup_daily_sales_batch
+from .cart import MAX_CART_OPERATIONS, CartManager
+from .db import write_transaction
+from .models import (
+    Cart, Product, ProductDailySales, ProductRecommendation, PurchaseHistory, Review, RollupCheckpoint, SiteReview,
+    VisitorCounter,
+)
+from .product_cache import VERSION_KEY, ProductCache, product_cache
+from .purge import purge_product
+from .recommendations import build_also_bought, build_similar, recommended_products
+from .rankings import (
+    TRENDING_HALF_LIFE_HOURS, decayed_log_weight, get_ranking, top_products, units_sold, update_rankings,
+)
+from .routers import REPLICA_DB_ALIAS, PrimaryReplicaRouter, _request_state
+from .management.commands.stress_sqlite import run_write_stress
+from .startup import LAZY_MODULES, WSGI_LOAD, measure_imports
+
+
+# Tests that go through the product or search caches get a private one,
+# never the file cache a dev server is using
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# The async endpoints as GUNICORN_PROFILE=asgi routes them, for
+# ROOT_URLCONF='core.tests'
+urlpatterns = [
+    path('cart/add/', views.aadd_to_cart),
+    path('cart/info/', views.aget_cart_info),
+    path('review/submit/', views.asubmit_review),
+    path('site-review/submit/', views.asubmit_site_review),
+]
+
+
+def reset_caches():
+    """Empty the shared cache and this worker's product LRU; test rows reuse ids"""
+    cache.clear()
+    with product_cache._lock:
+        product_cache._entries.clear()
+        product_cache._version = None
+
+
+class AccelRedirectStandIn:
+    """
+    Minimal local stand-in for the nginx internal location: resolves an
+    X-Accel-Redirect response back to the bytes nginx would have sent.
+    """
+
+    def __init__(self, location, root):
+        self.location = location
+        self.root = root
+
+    def resolve(self, response):
+        uri = unquote(response['X-Accel-Redirect'])
+        assert uri.startswith(self.location)
+        with open(os.path.join(self.root, uri[len(self.location):]), 'rb') as f:
+            return f.read()
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'products'))
+        self.payload = bytes(range(256)) * 4
+        with open(os.path.join(self.media_root, 'products', 'p.png'), 'wb') as f:
+            f.write(self.payload)
+        self.override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_OFFLOAD_HEADER='')
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_full_response_has_validators(self):
+        response = self.client.get('/media/products/p.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_conditional_requests_return_304(self):
+        first = self.client.get('/media/products/p.png')
+        response = self.client.get('/media/products/p.png', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/media/products/p.png', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get('/media/products/p.png', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/%d' % len(self.payload))
+        self.assertEqual(b''.join(response.streaming_content), self.payload[10:20])
+
+        response = self.client.get('/media/products/p.png', HTTP_RANGE='bytes=-8')
+        self.assertEqual(b''.join(response.streaming_content), self.payload[-8:])
+
+        response = self.client.get('/media/products/p.png', HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_stale_if_range_sends_full_body(self):
+        response = self.client.get('/media/products/p.png', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_path_traversal_is_rejected(self):
+        response = self.client.get('/media/../core/models.py')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/media/products/missing.png')
+        self.assertEqual(response.status_code, 404)
+
+    def test_x_accel_redirect_offload(self):
+        with override_settings(MEDIA_OFFLOAD_HEADER='X-Accel-Redirect',
+                               MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.client.get('/media/products/p.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/products/p.png')
+        front = AccelRedirectStandIn('/protected-media/', self.media_root)
+        self.assertEqual(front.resolve(response), self.payload)
+
+    def test_x_sendfile_offload(self):
+        with override_settings(MEDIA_OFFLOAD_HEADER='X-Sendfile'):
+            response = self.client.get('/media/products/p.png')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'products', 'p.png'))
+
+    def test_offload_quotes_non_ascii_names(self):
+        name = 'صورة منتج.png'
+        with open(os.path.join(self.media_root, 'products', name), 'wb') as f:
+            f.write(self.payload)
+        with override_settings(MEDIA_OFFLOAD_HEADER='X-Accel-Redirect',
+                               MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.client.get(f'/media/products/{name}')
+        self.assertTrue(response['X-Accel-Redirect'].isascii())
+        front = AccelRedirectStandIn('/protected-media/', self.media_root)
+        self.assertEqual(front.resolve(response), self.payload)
+
+        with override_settings(MEDIA_OFFLOAD_HEADER='X-Sendfile'):
+            response = self.client.get(f'/media/products/{name}')
+        self.assertEqual(unquote(response['X-Sendfile']), os.path.join(self.media_root, 'products', name))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class EffectivePriceTests(TestCase):
+    def setUp(self):
+        reset_caches()
+
+    def make_product(self, price, discount=None):
+        return Product.objects.create(name='P', price=Decimal(price), discount=discount and Decimal(discount),
+                                      description='', category='c', stock=5)
+
+    def test_column_matches_get_discounted_price(self):
+        cases = [('99', '15', '84.15'), ('13', '5', '12.35'), ('0.10', '15', '0.09'), ('20', None, '20')]
+        for price, discount, expected in cases:
+            product = self.make_product(price, discount)
+            product.refresh_from_db()
+            self.assertEqual(product.effective_price, Decimal(expected))
+            self.assertEqual(product.effective_price, product.get_discounted_price())
+
+    def test_cart_total_uses_effective_price(self):
+        product = self.make_product('99', '15')
+        response = self.client.post('/cart/add/', {'product_id': product.id, 'quantity': 2},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['cart_total_price'], '168.30')
+        response = self.client.get('/cart/')
+        self.assertEqual(response.context['total_price'], Decimal('168.30'))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ProductApiTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        # Effective prices 10, 12.35, 10, 84.15, 30
+        for price, discount in (('10', None), ('13', '5'), ('20', '50'), ('99', '15'), ('30', None)):
+            Product.objects.create(name=f'P{price}', price=Decimal(price), discount=discount and Decimal(discount),
+                                   description='', category='c', stock=5)
+
+    def pages(self, **params):
+        prices, cursor = [], None
+        while True:
+            page = self.client.get('/api/products/', {**params, 'limit': 2, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(page.status_code, 200)
+            prices += [Decimal(row['price']) for row in page.json()['results']]
+            cursor = page.json()['next_cursor']
+            if not cursor:
+                return prices
+
+    def test_price_sort_pages_through_ties(self):
+        self.assertEqual(self.pages(sort='price', fields='price'), [10, 20, 13, 30, 99])
+        self.assertEqual(self.pages(sort='-price', fields='price'), [99, 30, 13, 20, 10])
+        self.assertEqual(self.pages(fields='price'), [30, 99, 20, 13, 10])
+
+    def test_price_range_uses_the_discounted_price(self):
+        self.assertEqual(self.pages(sort='price', fields='price', min_price='10', max_price='30'), [10, 20, 13, 30])
+        self.assertEqual(self.pages(sort='price', fields='price', min_price='12.35', max_price='84'), [13, 30])
+        for params in ({'min_price': '-1'}, {'max_price': 'cheap'}, {'sort': 'name'}, {'sort': 'price', 'cursor': 'x'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/products/', params).status_code, 400)
+
+    def test_etag_changes_with_the_catalogue(self):
+        etag = self.client.get('/api/products/')['ETag']
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Product.objects.filter(price=Decimal('30')).get().save()
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ProductCacheTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.product = Product.objects.create(name='P', price=Decimal('10'), description='', category='c', stock=5)
+
+    def test_missing_version_is_seeded_from_the_clock(self):
+        started = int(time.time())
+        version = ProductCache().version()
+        self.assertGreaterEqual(version, started)
+        self.assertEqual(cache.get(VERSION_KEY), version)
+
+    def test_save_invalidates_cached_product(self):
+        self.assertEqual(product_cache.get(self.product.id).price, Decimal('10'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('12')
+            self.product.save()
+        self.assertEqual(product_cache.get(self.product.id).price, Decimal('12'))
+
+    def test_soft_delete_invalidates_cached_product(self):
+        product_cache.get(self.product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.soft_delete()
+        with self.assertRaises(Product.DoesNotExist):
+            product_cache.get(self.product.id)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class SearchTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        for name, price, category in (('Red shoe', '8', 'shoes'), ('Blue shoe', '30', 'shoes'), ('Shoe bag', '60', 'bags')):
+            Product.objects.create(name=name, price=Decimal(price), description='', category=category, stock=1)
+
+    def test_facets_and_price_sort(self):
+        response = self.client.get('/search/', {'q': 'shoe', 'price': '25-50', 'sort': 'price'})
+        self.assertEqual([p.name for p in response.context['products']], ['Blue shoe'])
+        self.assertEqual(response.context['categories'], [('shoes', 1)])
+        counts = {bucket: count for bucket, _, _, count in response.context['price_facets']}
+        self.assertEqual((counts['0-10'], counts['25-50'], counts['50-100']), (1, 1, 1))
+
+        response = self.client.get('/search/', {'q': 'shoe', 'sort': '-price'})
+        self.assertEqual([p.name for p in response.context['products']], ['Shoe bag', 'Blue shoe', 'Red shoe'])
+
+    def test_product_changes_reach_cached_results(self):
+        self.assertEqual(self.client.get('/search/', {'q': 'shoe'}).context['total_results'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Green shoe', price=Decimal('9'), description='', category='shoes', stock=1)
+        self.assertEqual(self.client.get('/search/', {'q': 'shoe'}).context['total_results'], 4)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(settings.DATABASES, {REPLICA_DB_ALIAS: {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = PrimaryReplicaRouter()
+
+    def in_request(self, pinned=False):
+        token = _request_state.set({'pinned': pinned, 'wrote': False})
+        self.addCleanup(_request_state.reset, token)
+
+    def test_catalogue_reads_use_the_replica_until_a_write(self):
+        self.in_request()
+        self.assertEqual(self.router.db_for_read(Product), REPLICA_DB_ALIAS)
+        self.assertIsNone(self.router.db_for_read(Cart))
+        # Visit logging does not pin; a catalogue write does
+        self.router.db_for_write(VisitorCounter)
+        self.assertEqual(self.router.db_for_read(Product), REPLICA_DB_ALIAS)
+        self.router.db_for_write(Product)
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_pinned_sessions_and_background_jobs_use_the_primary(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        self.in_request(pinned=True)
+        self.assertIsNone(self.router.db_for_read(Product))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class VisitorCounterTests(TestCase):
+    def setUp(self):
+        reset_caches()
+
+    def test_repeat_visits_skip_the_write_transaction(self):
+        self.client.get('/', REMOTE_ADDR='10.0.0.1')
+        with mock.patch('core.views._record_visit') as record:
+            self.client.get('/', REMOTE_ADDR='10.0.0.1')
+        record.assert_not_called()
+        self.client.get('/', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(VisitorCounter.objects.count(), 2)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        product = Product.objects.create(name='P', price=Decimal('5'), description='', category='c', stock=1)
+        for quantity in range(1, 6):
+            PurchaseHistory.objects.create(product=product, quantity=quantity)
+
+    def test_csv_export_crosses_keyset_batches(self):
+        with mock.patch('core.exports.KEYSET_BATCH_SIZE', 2):
+            response = self.client.get('/dashboard/export/purchases/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'id')
+        self.assertEqual([line.split(',')[5] for line in lines[1:]], ['1', '2', '3', '4', '5'])
+
+    def test_bad_dates_are_400(self):
+        for params, name in (({'start': 'yesterday'}, 'start'), ({'end': '2024-02-30'}, 'end')):
+            response = self.client.get('/dashboard/export/purchases/', params)
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(response.json()['message'].startswith(name))
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.a = Product.objects.create(name='A', price=Decimal('10'), discount=Decimal('10'), description='',
+                                        category='c', stock=50)
+        self.b = Product.objects.create(name='B', price=Decimal('20'), description='', category='c', stock=50)
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        for product, quantity, when in ((self.a, 2, None), (self.a, 1, yesterday), (self.b, 3, None),
+                                        (self.a, 1, None), (self.b, 1, yesterday)):
+            self.purchase(product, quantity, when)
+
+    def purchase(self, product, quantity, when=None):
+        purchase = PurchaseHistory.objects.create(product=product, quantity=quantity)
+        if when:
+            PurchaseHistory.objects.filter(pk=purchase.pk).update(purchase_date=when)
+
+    def rollup(self):
+        call_command('rollup_sales', batch_size=2, stdout=StringIO())
+
+    def assert_matches_purchases(self):
+        expected = {}
+        for purchase in PurchaseHistory.objects.select_related('product'):
+            key = (purchase.product_id, timezone.localdate(purchase.purchase_date))
+            units, revenue = expected.get(key, (0, Decimal('0')))
+            expected[key] = (units + purchase.quantity,
+                             revenue + purchase.quantity * purchase.product.get_discounted_price())
+        rollups = {(row.product_id, row.date): (row.units, row.revenue) for row in ProductDailySales.objects.all()}
+        self.assertEqual(rollups, expected)
+
+    def test_totals_match_purchase_history(self):
+        self.rollup()
+        self.assert_matches_purchases()
+        self.assertEqual(ProductDailySales.objects.get(product=self.a, date=timezone.localdate()).revenue,
+                         Decimal('27.00'))
+
+    def test_second_run_adds_nothing(self):
+        self.rollup()
+        before = list(ProductDailySales.objects.values_list('product_id', 'date', 'units', 'revenue'))
+        self.assertEqual(rollup_daily_sales_batch(), 0)
+        self.rollup()
+        self.assertEqual(list(ProductDailySales.objects.values_list('product_id', 'date', 'units', 'revenue')),
+                         before)
+
+    def test_resumed_run_counts_each_purchase_once(self):
+        # Interrupted after one batch, then more purchases arrive
+        self.assertEqual(rollup_daily_sales_batch(batch_size=2), 2)
+        self.purchase(self.a, 4)
+        self.purchase(self.b, 2)
+        self.rollup()
+        self.assert_matches_purchases()
+        self.assertEqual(RollupCheckpoint.objects.get(name=DAILY_SALES_CHECKPOINT).last_id,
+                         PurchaseHistory.objects.order_by('-id').values_list('id', flat=True).first())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RankingTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.a, self.b, self.c = [
+            Product.objects.create(name=name, price=Decimal('5'), description='', category='Skin', stock=50)
+            for name in 'ABC'
+        ]
+
+    def purchase(self, product, quantity, hours_ago=0):
+        purchase = PurchaseHistory.objects.create(product=product, quantity=quantity)
+        if hours_ago:
+            PurchaseHistory.objects.filter(pk=purchase.pk).update(
+                purchase_date=timezone.now() - datetime.timedelta(hours=hours_ago)
+            )
+
+    def ids(self, kind, category=''):
+        return [product_id for _, product_id in get_ranking(kind, category)]
+
+    def test_bestsellers_order_by_units_then_id(self):
+        for product, quantity in ((self.a, 3), (self.b, 5), (self.c, 1), (self.c, 2)):
+            self.purchase(product, quantity)
+        Review.objects.create(product=self.a, rating=5, comment='ok')
+        update_rankings()
+        self.assertEqual(self.ids('bestsellers'), [self.b.id, self.a.id, self.c.id])
+        self.assertEqual(self.ids('bestsellers', 'skin'), [self.b.id, self.a.id, self.c.id])
+        self.assertEqual(units_sold(self.c.id), 3)
+        self.assertEqual(self.client.get(f'/product/{self.c.id}/').context['purchase_count'], 3)
+
+    def test_trending_decays_with_age(self):
+        now = timezone.now()
+        half_life = datetime.timedelta(hours=TRENDING_HALF_LIFE_HOURS)
+        self.assertAlmostEqual(decayed_log_weight(1, now + half_life) - decayed_log_weight(1, now), math.log(2))
+        # 4 units three half-lives ago weigh 0.5, less than 1 unit now; 4 two ago weigh 1.5 with a review
+        self.purchase(self.a, 4, hours_ago=3 * TRENDING_HALF_LIFE_HOURS)
+        self.purchase(self.b, 1)
+        self.purchase(self.c, 4, hours_ago=2 * TRENDING_HALF_LIFE_HOURS)
+        Review.objects.create(product=self.c, rating=4, comment='ok')
+        update_rankings()
+        self.assertEqual(self.ids('trending'), [self.c.id, self.b.id, self.a.id])
+        self.assertEqual(self.ids('bestsellers'), [self.a.id, self.c.id, self.b.id])
+
+    def test_updates_merge_into_cached_lists(self):
+        self.purchase(self.a, 3)
+        self.purchase(self.b, 2)
+        update_rankings()
+        self.assertEqual(self.ids('bestsellers'), [self.a.id, self.b.id])
+        self.assertEqual(self.ids('bestsellers', 'Skin'), [self.a.id, self.b.id])
+        self.purchase(self.c, 1)
+        self.purchase(self.b, 2)
+        with mock.patch('core.rankings.RANKING_SIZE', 2), mock.patch('core.rankings.build_ranking') as build:
+            update_rankings()
+            self.assertEqual(self.ids('bestsellers'), [self.b.id, self.a.id])
+            self.assertEqual(self.ids('bestsellers', 'Skin'), [self.b.id, self.a.id])
+        build.assert_not_called()
+
+    def test_changed_products_leave_cached_lists(self):
+        for product, quantity in ((self.a, 3), (self.b, 2), (self.c, 1)):
+            self.purchase(product, quantity)
+        update_rankings()
+        self.assertEqual(self.ids('bestsellers', 'Skin'), [self.a.id, self.b.id, self.c.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a.category = 'Hair'
+            self.a.save()
+            self.b.is_available = False
+            self.b.save()
+        self.assertEqual(self.ids('bestsellers', 'Skin'), [self.c.id])
+        self.assertEqual(self.ids('bestsellers', 'Hair'), [self.a.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.soft_delete()
+        self.assertEqual(self.ids('bestsellers'), [self.a.id])
+        self.assertEqual(top_products('bestsellers'), [self.a])
+
+
+class AlsoBoughtTests(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c, self.d = [
+            Product.objects.create(name=name, price=Decimal('5'), description='', category='c', stock=50)
+            for name in 'ABCD'
+        ]
+        user = User.objects.create_user('buyer')
+        baskets = [
+            ({'session_key': 's1'}, (self.a, self.b, self.c)),
+            ({'session_key': 's2'}, (self.a, self.b, self.b)),
+            ({'session_key': 's3'}, (self.b, self.c)),
+            ({'session_key': 's4'}, (self.d,)),
+            ({'user': user, 'session_key': 'u1'}, (self.a, self.d)),
+            # Neither user nor session: belongs to no basket
+            ({}, (self.c, self.d)),
+        ]
+        for buyer, products in baskets:
+            for product in products:
+                PurchaseHistory.objects.create(product=product, **buyer)
+
+    def neighbours(self):
+        rows = ProductRecommendation.objects.filter(kind=ProductRecommendation.ALSO_BOUGHT).order_by('product', 'rank')
+        result = {}
+        for row in rows:
+            result.setdefault(row.product_id, []).append(row.recommended_id)
+        return result
+
+    def test_min_support_keeps_pairs_bought_together_often_enough(self):
+        # Shared baskets: A-B 2, B-C 2, A-C 1, A-D 1
+        self.assertEqual(build_also_bought(metric='count', min_support=2), 4)
+        a, b, c = self.a.id, self.b.id, self.c.id
+        self.assertEqual(self.neighbours(), {a: [b], b: [a, c], c: [b]})
+
+    def test_cosine_discounts_popular_products(self):
+        build_also_bought(top_k=1)
+        a, b, c, d = self.a.id, self.b.id, self.c.id, self.d.id
+        # B-C (2 / sqrt(3 * 2)) beats A-B (2 / sqrt(3 * 3)) for B
+        self.assertEqual(self.neighbours(), {a: [b], b: [c], c: [b], d: [a]})
+        self.assertEqual(recommended_products(self.b, ProductRecommendation.ALSO_BOUGHT), [self.c])
+
+
+class SimilarProductsTests(TestCase):
+    def setUp(self):
+        products = (('rose face cream', 'face'), ('rose face serum', 'face'), ('argan hair oil', 'hair'),
+                    ('argan hair oil shampoo', 'hair'), ('lavender soap', 'bath'))
+        self.products = [
+            Product.objects.create(name=name, price=Decimal('5'), description='', category=category, stock=5)
+            for name, category in products
+        ]
+        self.assertEqual(build_similar(top_k=1, full=True)[0], 5)
+
+    def rename(self, product, name, category):
+        product.name, product.category = name, category
+        product.save()
+
+    def refreshed(self):
+        rows, _ = build_similar(top_k=1)
+        return rows
+
+    def similar(self, product):
+        return recommended_products(product, ProductRecommendation.SIMILAR)
+
+    def test_refreshes_changed_products_and_lists_they_enter(self):
+        cream, serum, oil, shampoo, soap = self.products
+        self.assertEqual(self.similar(cream), [serum])
+        untouched = list(ProductRecommendation.objects.filter(product__in=[serum, oil, shampoo])
+                         .values_list('id', flat=True))
+        self.rename(soap, 'rose face cream mask', 'face')
+        # The mask, and the cream whose list it now tops; the serum keeps the closer cream
+        self.assertEqual(self.refreshed(), 2)
+        self.assertEqual((self.similar(soap), self.similar(cream), self.similar(serum)), ([cream], [soap], [cream]))
+        self.assertEqual(list(ProductRecommendation.objects.filter(product__in=[serum, oil, shampoo])
+                              .values_list('id', flat=True)), untouched)
+        self.assertEqual(self.refreshed(), 0)
+
+    def test_refreshes_lists_a_changed_product_leaves(self):
+        cream, serum, oil, shampoo, soap = self.products
+        self.rename(cream, 'lavender bath salt', 'bath')
+        # The salt, the serum that listed it and the soap it can now enter
+        self.assertEqual(self.refreshed(), 3)
+        self.assertEqual(self.similar(serum), [])
+        self.assertEqual(self.similar(soap), [cream])
+
+    def test_full_lists_are_only_refreshed_for_better_neighbours(self):
+        cream, serum, oil, shampoo, soap = self.products
+        # Shares "hair" with the oil and the shampoo, which already hold a
+        # closer neighbour in their single slot
+        self.rename(soap, 'hair brush', 'bath')
+        self.assertEqual(self.refreshed(), 1)
+        self.assertEqual(self.similar(oil), [shampoo])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.product = Product.objects.create(name='P', price=Decimal('10'), description='', category='C', stock=5)
+        self.body = {'operations': [{'ids': [self.product.id], 'add': {'stock': 3}, 'multiply': {'price': '1.5'}}]}
+
+    def test_requires_staff(self):
+        response = self.client.post('/dashboard/bulk-update/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_applies_operations(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        response = self.client.post('/dashboard/bulk-update/', self.body, content_type='application/json')
+        self.assertTrue(response.json()['success'])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.price), (8, Decimal('15')))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ProductImportTests(TestCase):
+    csv = (
+        'sku,name,category,price,stock,discount,description,is_available\n'
+        'A1,Lamp,home,12.50,3,,Brass desk lamp,\n'
+        'A2,Chair,home,-4,1,,Folding chair,\n'
+    )
+
+    def setUp(self):
+        reset_caches()
+        self.import_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.import_dir)
+        override = override_settings(PRODUCT_IMPORT_DIR=self.import_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        Product.objects.create(sku='A1', name='Old lamp', price=Decimal('9'), description='', category='Home', stock=1)
+
+    def upload(self):
+        response = self.client.post('/dashboard/import-products/', {
+            'csv_file': SimpleUploadedFile('products.csv', self.csv.encode(), content_type='text/csv'),
+        })
+        return response
+
+    def test_requires_staff(self):
+        self.assertEqual(self.upload().status_code, 302)
+        self.assertEqual(self.client.get('/dashboard/import-products/rejects/x.csv/').status_code, 302)
+
+    def test_upserts_by_sku_and_keeps_rejects(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        lines = b''.join(self.upload().streaming_content).decode().splitlines()
+        final = json.loads(lines[-1])
+        self.assertTrue(final['done'])
+        self.assertEqual(final['rejected'], 1)
+
+        lamp = Product.objects.get(sku='A1')
+        self.assertEqual((lamp.name, lamp.price, lamp.stock), ('Lamp', Decimal('12.50'), 3))
+        self.assertFalse(Product.objects.filter(sku='A2').exists())
+
+        response = self.client.get(final['rejects_url'])
+        rejects = b''.join(response.streaming_content).decode()
+        self.assertIn('A2', rejects)
+        self.assertNotIn('A1', rejects)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.kept = Product.objects.create(name='Kept', price=Decimal('5'), description='', category='c', stock=9)
+        self.gone = Product.objects.create(name='Gone', price=Decimal('7'), description='', category='c', stock=9)
+        Review.objects.create(product=self.gone, rating=4, comment='ok')
+
+    def add_to_cart(self, product, quantity):
+        return self.client.post('/cart/add/', {'product_id': product.id, 'quantity': quantity},
+                                content_type='application/json')
+
+    def test_cart_drops_deleted_products(self):
+        self.add_to_cart(self.kept, 1)
+        self.add_to_cart(self.gone, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gone.soft_delete()
+        # The cart page prunes the item and saves the session
+        response = self.client.get('/cart/')
+        self.assertEqual(response.context['total_items'], 1)
+        self.assertEqual([item['product'] for item in response.context['cart_items']], [self.kept])
+        self.assertEqual(self.client.session['cart'], {str(self.kept.id): {'quantity': 1}})
+        info = self.client.get('/cart/info/').json()
+        self.assertEqual(info['cart_total_items'], 1)
+        self.assertEqual(info['cart_total_price'], '5.00')
+        self.assertEqual([item['name'] for item in info['cart_items']], ['Kept'])
+
+    def test_totals_drop_deleted_products_without_querying_on_every_page(self):
+        self.add_to_cart(self.kept, 1)
+        self.add_to_cart(self.gone, 2)
+        self.gone.soft_delete()
+        request = RequestFactory().get('/')
+        request.session, request.user = self.client.session, AnonymousUser()
+        self.assertIn('cart', request.session)
+        with self.assertNumQueries(0):
+            self.assertEqual(CartManager(request).get_total_items(), 3)
+        cart = CartManager(request)
+        self.assertEqual((cart.get_total_price(), len(cart)), (Decimal('5.00'), 1))
+        self.assertTrue(request.session.modified)
+        json.dumps(request.session['cart'])
+
+    def test_reviews_api_is_404_after_delete(self):
+        url = f'/api/products/{self.gone.id}/reviews/'
+        etag = self.client.get(url)['ETag']
+        self.gone.soft_delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_admin_delete_is_soft(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.client.post(f'/admin/core/product/{self.gone.id}/delete/', {'post': 'yes'})
+        self.client.post('/admin/core/product/', {
+            'action': 'delete_selected', '_selected_action': [self.kept.id], 'post': 'yes',
+        })
+        self.assertFalse(Product.objects.exists())
+        self.assertEqual(Product.all_objects.filter(is_deleted=True).count(), 2)
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_purge_removes_history_then_product(self):
+        self.gone.soft_delete()
+        self.assertEqual(purge_product(self.gone.id, batch_size=1, pause=0), 1)
+        self.assertFalse(Product.all_objects.filter(pk=self.gone.id).exists())
+        self.assertFalse(Review.objects.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ReviewsApiTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.product = Product.objects.create(name='P', price=Decimal('4'), description='', category='c', stock=5)
+        for rating in (5, 3, 4, 5, 1):
+            Review.objects.create(product=self.product, rating=rating, comment='ok')
+        self.url = f'/api/products/{self.product.id}/reviews/'
+
+    def test_cursor_pages_cover_every_review_once(self):
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            page = self.client.get(self.url, params).json()
+            self.assertLessEqual(len(page['results']), 2)
+            ids += [review['id'] for review in page['results']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(ids, sorted(Review.objects.values_list('id', flat=True), reverse=True))
+        page = self.client.get(self.url, {'rating': '4,5'}).json()
+        self.assertEqual(sorted(review['rating'] for review in page['results']), [4, 5, 5])
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nonsense'}).status_code, 400)
+
+    def test_etag_changes_with_a_new_review(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        Review.objects.create(product=self.product, rating=2, comment='new')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_changes_when_a_review_is_edited(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        review = Review.objects.order_by('id').first()
+        etag = self.client.get(self.url)['ETag']
+        page_url = f'/product/{self.product.id}/'
+        self.client.get(page_url)
+        page_etag = self.client.get(page_url)['ETag']
+        self.client.post(f'/admin/core/review/{review.id}/change/', {
+            'product': self.product.id, 'reviewer_name': 'Anonymous', 'rating': 1, 'comment': 'Changed my mind',
+        })
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Changed my mind', [row['comment'] for row in response.json()['results']])
+        self.assertEqual(self.client.get(page_url, HTTP_IF_NONE_MATCH=page_etag).status_code, 200)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CartBatchTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.a = Product.objects.create(name='A', price=Decimal('3'), description='', category='c', stock=9)
+        self.b = Product.objects.create(name='B', price=Decimal('5'), description='', category='c', stock=9)
+
+    def batch(self, *operations):
+        return self.client.post('/cart/batch/', {'operations': list(operations)}, content_type='application/json')
+
+    def cart_info(self):
+        info = self.client.get('/cart/info/').json()
+        return info['cart_total_items'], info['cart_total_price']
+
+    def test_operations_apply_in_order(self):
+        response = self.batch(
+            {'op': 'add', 'product_id': self.a.id, 'quantity': 2},
+            {'op': 'add', 'product_id': self.b.id},
+            {'op': 'update', 'product_id': self.a.id, 'quantity': 4},
+            {'op': 'remove', 'product_id': self.b.id},
+            {'op': 'add', 'product_id': self.b.id, 'quantity': 3},
+        )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual((data['cart_total_items'], data['cart_total_price']), (7, '27.00'))
+        self.assertEqual(self.cart_info(), (7, '27.00'))
+        self.assertEqual(PurchaseHistory.objects.count(), 3)
+
+    def test_invalid_batches_change_nothing(self):
+        self.batch({'op': 'add', 'product_id': self.a.id})
+        invalid = [
+            [{'op': 'add', 'product_id': self.b.id}, {'op': 'explode', 'product_id': self.a.id}],
+            [{'op': 'add', 'product_id': self.b.id}, {'op': 'add', 'product_id': self.a.id, 'quantity': 0}],
+            [{'op': 'update', 'product_id': self.a.id}],
+            [{'op': 'remove', 'product_id': self.a.id}] * (MAX_CART_OPERATIONS + 1),
+            [],
+        ]
+        for operations in invalid:
+            with self.subTest(operations=operations[:2]):
+                self.assertEqual(self.batch(*operations).status_code, 400)
+        response = self.batch({'op': 'add', 'product_id': self.b.id}, {'op': 'add', 'product_id': 0})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.cart_info(), (1, '3.00'))
+        self.assertEqual(PurchaseHistory.objects.count(), 1)
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        product = Product.objects.create(name='P', price=Decimal('4'), description='', category='c', stock=5)
+        reviews = [Review.objects.create(product=product, rating=rating, comment='ok') for rating in (5, 4, 5, 2)]
+        reviews[1].delete()
+
+    def test_count_is_estimated_only_when_unfiltered(self):
+        # The deleted row leaves a gap the pk range still counts
+        self.assertEqual(EstimatedCountPaginator(Review.objects.all(), 50).count, 4)
+        self.assertEqual(EstimatedCountPaginator(Review.objects.filter(rating=5), 50).count, 2)
+        self.assertEqual(EstimatedCountPaginator(SiteReview.objects.all(), 50).count, 0)
+
+    def test_changelist_has_no_delete_selected(self):
+        request = self.client.get('/admin/core/review/').wsgi_request
+        for model in (Review, PurchaseHistory, SiteReview, VisitorCounter):
+            self.assertNotIn('delete_selected', admin.site._registry[model].get_actions(request))
+        self.assertIn('delete_selected', admin.site._registry[Product].get_actions(request))
+
+    def test_approve_site_reviews(self):
+        pending = [SiteReview.objects.create(rating=5, comment='Great', is_approved=False) for _ in range(2)]
+        SiteReview.objects.create(rating=1, comment='Bad', is_approved=False)
+        self.client.post('/admin/core/sitereview/', {
+            'action': 'approve_reviews', '_selected_action': [review.id for review in pending],
+        })
+        self.assertEqual(sorted(SiteReview.objects.filter(is_approved=True).values_list('id', flat=True)),
+                         [review.id for review in pending])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class AjaxViewProfileTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.product = Product.objects.create(name='P', price=Decimal('4'), description='', category='c', stock=5)
+
+    def test_wsgi_profile_routes_to_sync_views(self):
+        self.assertIs(resolve('/cart/add/').func, views.add_to_cart)
+        self.assertIs(resolve('/review/submit/').func, views.submit_review)
+
+    def test_sync_views(self):
+        self.client.post('/cart/add/', {'product_id': self.product.id, 'quantity': 3}, content_type='application/json')
+        info = self.client.get('/cart/info/').json()
+        self.assertEqual((info['cart_total_items'], info['cart_total_price']), (3, '12.00'))
+        response = self.client.post('/review/submit/', {'product_id': self.product.id, 'rating': 4, 'comment': 'Good'},
+                                    content_type='application/json')
+        self.assertEqual((response.json()['avg_rating'], response.json()['review_count']), (4, 1))
+        response = self.client.post('/site-review/submit/', {'rating': 5, 'comment': 'Lovely shop'})
+        self.assertEqual((response.json()['new_average'], response.json()['review']['reviewer_name']),
+                         (5, 'Anonymous'))
+
+    def test_invalid_submissions(self):
+        response = self.client.post('/review/submit/', {'product_id': self.product.id, 'rating': 6, 'comment': 'x'},
+                                    content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['message']), (400, 'Invalid product ID or rating.'))
+        response = self.client.post('/cart/update/', {'product_id': self.product.id},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/site-review/submit/', {'rating': 4})
+        self.assertEqual((response.status_code, response.json()['error']), (400, 'Please provide a comment'))
+        response = self.client.post('/site-review/submit/', {'rating': 'five', 'comment': 'Nice'})
+        self.assertEqual((response.status_code, response.json()['message']), (400, 'Invalid rating value'))
+
+    @override_settings(ROOT_URLCONF='core.tests')
+    async def test_async_views(self):
+        await self.async_client.post('/cart/add/', {'product_id': self.product.id, 'quantity': 3},
+                                     content_type='application/json')
+        info = (await self.async_client.get('/cart/info/')).json()
+        self.assertEqual((info['cart_total_items'], info['cart_total_price']), (3, '12.00'))
+        self.assertEqual(info['cart_items'][0]['name'], 'P')
+        response = await self.async_client.post('/review/submit/', {
+            'product_id': self.product.id, 'rating': 4, 'comment': 'Good',
+        }, content_type='application/json')
+        self.assertEqual((response.json()['avg_rating'], response.json()['review_count']), (4, 1))
+        response = await self.async_client.post('/site-review/submit/', {'rating': 5, 'comment': 'Lovely shop'})
+        self.assertEqual((response.json()['new_average'], response.json()['review']['reviewer_name']),
+                         (5, 'Anonymous'))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.product = Product.objects.create(name='P', price=Decimal('4'), description='', category='c', stock=5)
+
+    def test_unchanged_pages_are_304_without_last_modified(self):
+        for url in ('/', f'/product/{self.product.id}/', '/search/?q=p'):
+            # The first visit records the visitor and sets the CSRF cookie
+            self.client.get(url)
+            first = self.client.get(url)
+            self.assertNotIn('Last-Modified', first)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+
+    def test_product_page_loads_its_own_reviews(self):
+        response = self.client.get(f'/product/{self.product.id}/')
+        self.assertContains(response, f"const reviewsUrl = '/api/products/{self.product.id}/reviews/';")
+        response = self.client.get('/product/')
+        self.assertContains(response, "const reviewsUrl = '';")
+
+    def test_etag_follows_the_session_cart_and_new_reviews(self):
+        url = f'/product/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.post('/cart/add/', {'product_id': self.product.id}, content_type='application/json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        Review.objects.create(product=self.product, rating=5, comment='Great')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_etag_follows_recommended_products(self):
+        other = Product.objects.create(name='Other', price=Decimal('9'), description='', category='c', stock=5)
+        ProductRecommendation.objects.create(product=self.product, recommended=other,
+                                             kind=ProductRecommendation.SIMILAR, rank=1, score=0.5)
+        url = f'/product/{self.product.id}/'
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        other.price = Decimal('7')
+        other.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['similar_products'][0].price, Decimal('7'))
+
+
+class MetricsEndpointTests(TestCase):
+    def test_requires_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_scrape_leaves_the_global_registry_alone(self):
+        from prometheus_client import REGISTRY, generate_latest
+
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        body = self.client.get('/metrics').content
+        self.assertIn(b'job_backlog_events{job="rankings_reviews"}', body)
+        self.assertIn(b'http_request_duration_seconds', body)
+        self.assertNotIn(b'job_backlog_events', generate_latest(REGISTRY))
+
+
+class GunicornConfigTests(SimpleTestCase):
+    def test_on_starting_clears_only_sample_files(self):
+        import runpy
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ('counter_123.db', 'operator-notes.txt'):
+            open(os.path.join(directory, name), 'w').close()
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            config = runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+            self.assertEqual(sorted(os.listdir(directory)), ['counter_123.db', 'operator-notes.txt'])
+            config['on_starting'](None)
+        self.assertEqual(os.listdir(directory), ['operator-notes.txt'])
+
+    def test_default_metrics_directory_is_private_to_the_server(self):
+        import runpy
+
+        with mock.patch.dict(os.environ):
+            os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+            first = runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+            first_dir = os.environ.pop('PROMETHEUS_MULTIPROC_DIR')
+            second = runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+            second_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+        self.assertNotEqual(first_dir, second_dir)
+        for config, directory in ((first, first_dir), (second, second_dir)):
+            self.assertTrue(os.path.isdir(directory))
+            config['on_exit'](None)
+            self.assertFalse(os.path.exists(directory))
+
+
+@override_settings(CACHES=LOCAL_CACHES, REQUEST_PROFILING=True, REQUEST_PROFILING_SLOW_MS=0,
+                   REQUEST_PROFILING_SAMPLE_RATE=1, REQUEST_PROFILING_TOP_N=50)
+class RequestProfilingTests(TestCase):
+    def test_profile_covers_middleware_queries(self):
+        reset_caches()
+        product = Product.objects.create(name='P', price=Decimal('4'), description='', category='c', stock=5)
+        self.client.force_login(User.objects.create_user('shopper', password='x'))
+        with self.assertLogs('core.profiling', 'WARNING') as logs:
+            response = self.client.post('/cart/add/', {'product_id': product.id}, content_type='application/json')
+        self.assertEqual({part.split(';')[0] for part in response['Server-Timing'].split(', ')},
+                         {'sql', 'tpl', 'view', 'total'})
+        # SessionMiddleware saves the cart after the view returns
+        self.assertIn('UPDATE "django_session"', logs.output[0])
+
+
+class SQLiteWriteProfileTests(TransactionTestCase):
+    def test_write_transaction_retries_locked_errors(self):
+        func = mock.Mock(side_effect=[OperationalError('database is locked'), OperationalError('database is locked'), 'ok'])
+        with mock.patch('core.db.time.sleep') as sleep:
+            self.assertEqual(write_transaction(func)(), 'ok')
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_write_transaction_does_not_retry_other_errors(self):
+        func = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with self.assertRaises(OperationalError):
+            write_transaction(func)()
+        self.assertEqual(func.call_count, 1)
+
+
+class SQLiteWriteStressTests(SimpleTestCase):
+    """Concurrent writers against a scratch file: the production profile must not lose writes"""
+
+    def test_production_profile_completes_every_write(self):
+        workers, writes = 4, 100
+        after = run_write_stress('production', workers=workers, writes=writes)
+        self.assertEqual(after['errors'], 0)
+        self.assertEqual(after['writes'], workers * writes)
+
+        before = run_write_stress('default', workers=workers, writes=writes)
+        # Stock settings drop writes to "database is locked" under the same load
+        self.assertGreaterEqual(after['writes'], before['writes'])
+
+
+class StartupBudgetTests(SimpleTestCase):
+    """Cold starts pay for every import done while loading the WSGI app"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.report = measure_imports(WSGI_LOAD)
+
+    def test_wsgi_load_within_budget(self):
+        self.assertLess(self.report.total_seconds, settings.STARTUP_BUDGET_SECONDS)
+
+    def test_heavy_modules_stay_lazy(self):
+        self.assertEqual(sorted(self.report.modules & set(LAZY_MODULES)), [])
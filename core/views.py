@@ -1,61 +1,76 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.urls import reverse
+from django.utils import timezone
+from django.utils._os import safe_join
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Product, Review, PurchaseHistory, SiteReview, VisitorCounter
-from .cart import CartManager
-from .forms import ProductForm
+from django.db.models import Avg, Count, Q
+from .models import Product, Review, PurchaseHistory, SiteReview, VisitorCounter, ProductRecommendation
+from .cart import CartManager, CartOperationError, parse_cart_operations
+from .analytics import sales_summary
+from .rankings import top_products, units_sold
+from .recommendations import recommended_products
+from .reviews import review_page, review_summary
+from .search import (
+    PRICE_BUCKETS, SEARCH_SORTS, normalize_price, normalize_sort, price_filter, search_facets, search_page,
+)
+from .db import write_transaction
+from .product_cache import PRODUCT_CACHE_FIELDS, aget_product_or_404, get_product_or_404, product_cache
+from .conditional import conditional_page, home_validators, product_validators, search_validators
+from pathlib import Path
+import codecs
 import json
+import uuid
 
 
+@conditional_page(search_validators)
 def search(request):
     """Search view for filtering products"""
     query = request.GET.get('q', '').strip()
     category = request.GET.get('category', '')
-    
-    # Start with available products
-    products = Product.objects.filter(is_available=True)
-    
-    # Apply search query if provided
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(category__icontains=query) |
-            Q(description__icontains=query)
-        )
-    
-    # Apply category filter if provided
-    if category:
-        products = products.filter(category__icontains=category)
-    
-    # Order by relevance (created_at for now)
-    products = products.order_by('-created_at')
-    
-    # Pagination
-    paginator = Paginator(products, 12)  # Show 12 products per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Get unique categories for filter dropdown
-    categories = Product.objects.filter(is_available=True).values_list('category', flat=True).distinct().order_by('category')
-    
+    price = normalize_price(request.GET.get('price', ''))
+    sort = normalize_sort(request.GET.get('sort', ''))
+
+    # Ids and counts come from the search cache, 12 products per page
+    page_obj = search_page(query, category, request.GET.get('page'), price, sort)
+    # Category and price-range counts for refining the search
+    facets = search_facets(query, category, price)
+
     context = {
         'current_page': 'search',
         'products': page_obj,
         'query': query,
         'category': category,
-        'categories': categories,
-        'total_results': products.count()
+        'price': price,
+        'sort': sort,
+        'categories': facets['categories'],
+        'price_facets': facets['prices'],
+        'total_results': page_obj.paginator.count
     }
     return render(request, 'search.html', context)
 
 # Create your views here.
 
-def home(request):
-    # Track visitor
+@write_transaction
+def _record_visit(client_ip, user_agent, today):
+    # Checked again under the write lock: another request may have recorded it
+    if not VisitorCounter.objects.filter(ip_address=client_ip, visit_date__date=today).exists():
+        VisitorCounter.objects.create(
+            ip_address=client_ip,
+            user_agent=user_agent,
+            page_visited='/'
+        )
+
+
+def record_visitor(request):
+    """Record the visitor's IP once per day"""
     def get_client_ip(request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
@@ -68,16 +83,22 @@ def home(request):
     client_ip = get_client_ip(request)
     user_agent = request.META.get('HTTP_USER_AGENT', '')
     
-    # Check if this IP visited today
+    # Check if this IP visited today; most home page views are repeat
+    # visits, which then never take the write lock
     from django.utils import timezone
     today = timezone.now().date()
     if not VisitorCounter.objects.filter(ip_address=client_ip, visit_date__date=today).exists():
-        VisitorCounter.objects.create(
-            ip_address=client_ip,
-            user_agent=user_agent,
-            page_visited='/'
-        )
-    
+        _record_visit(client_ip, user_agent, today)
+
+
+def home(request):
+    # Visits are recorded even when the page itself is not re-sent
+    record_visitor(request)
+    return home_page(request)
+
+
+@conditional_page(home_validators)
+def home_page(request):
     # Get visitor statistics
     total_visitors = VisitorCounter.get_total_visitors()
     today_visitors = VisitorCounter.get_today_visitors()
@@ -102,17 +123,30 @@ def home(request):
     if category_filter:
         all_products = all_products.filter(category__icontains=category_filter)
     
-    # Order by creation date
-    all_products = all_products.order_by('-created_at')
+    # Optional discounted-price range and sort, on the indexed effective_price
+    price = normalize_price(request.GET.get('price', ''))
+    if price:
+        all_products = all_products.filter(price_filter(price))
+    sort = normalize_sort(request.GET.get('sort', ''))
+    all_products = all_products.order_by(*SEARCH_SORTS[sort])
     
     # Get unique categories for the category sections
     categories = Product.objects.filter(is_available=True).values_list('category', flat=True).distinct().order_by('category')
     
+    # Rankings come precomputed from the cache (see core.rankings)
+    bestseller_products = top_products('bestsellers', category_filter)
+    trending_products = top_products('trending', category_filter)
+    
     context = {
         'current_page': 'home',
         'all_products': all_products,
+        'bestseller_products': bestseller_products,
+        'trending_products': trending_products,
         'categories': categories,
         'selected_category': category_filter,
+        'price': price,
+        'sort': sort,
+        'price_buckets': PRICE_BUCKETS,
         'total_visitors': total_visitors,
         'today_visitors': today_visitors,
         'site_reviews': site_reviews,
@@ -131,30 +165,39 @@ def about(request):
     context = {'current_page': 'about'}
     return render(request, 'about.html', context)  # Using home template for now
 
+@conditional_page(product_validators)
 def product(request, product_id=None):
     if product_id:
         try:
-            product_obj = get_object_or_404(Product, id=product_id)
-            # Get reviews for this product
-            reviews = Review.objects.filter(product=product_obj)
-            # Get purchase count
-            purchase_count = PurchaseHistory.objects.filter(product=product_obj).count()
-            # Calculate average rating
-            avg_rating = 0
-            if reviews.exists():
-                total_rating = sum(review.rating for review in reviews)
-                avg_rating = round(total_rating / reviews.count(), 1)
+            product_obj = get_product_or_404(product_id)
+            # First page only; the rest load from the reviews API
+            reviews, reviews_next_cursor = review_page(product_obj.id)
+            avg_rating, review_count = review_summary(product_obj.id)
+            # Maintained by manage.py update_rankings, no count over the purchases
+            purchase_count = units_sold(product_obj.id)
+            # Precomputed by manage.py build_recommendations
+            also_bought = recommended_products(product_obj, ProductRecommendation.ALSO_BOUGHT)
+            # Precomputed by manage.py build_similar_products
+            similar_products = recommended_products(product_obj, ProductRecommendation.SIMILAR)
         except:
             # If product not found, create a default product for demo
             product_obj = None
             reviews = []
+            reviews_next_cursor = None
+            review_count = 0
             purchase_count = 0
             avg_rating = 0
+            also_bought = []
+            similar_products = []
     else:
         product_obj = None
         reviews = []
+        reviews_next_cursor = None
+        review_count = 0
         purchase_count = 0
         avg_rating = 0
+        also_bought = []
+        similar_products = []
     
     context = {
         'current_page': 'product',
@@ -162,7 +205,10 @@ def product(request, product_id=None):
         'reviews': reviews,
         'purchase_count': purchase_count,
         'avg_rating': avg_rating,
-        'review_count': len(reviews)
+        'review_count': review_count,
+        'reviews_next_cursor': reviews_next_cursor,
+        'also_bought': also_bought,
+        'similar_products': similar_products
     }
     return render(request, 'product.html', context)
 
@@ -181,38 +227,103 @@ def cart(request):
     return render(request, 'cart.html', context)
 
 
+# The AJAX cart and review endpoints come in two versions: sync for the
+# WSGI profile and async for ASGI (see ajax_view in Dr_Ahmed/urls.py).
+# Parsing, validation and response bodies are shared below, so the two
+# versions differ only in how they reach the database.
+
+def _cart_item_request(request, default_quantity=None):
+    """``(product_id, quantity)`` from a single-product cart request's JSON body"""
+    data = json.loads(request.body)
+    return data.get('product_id'), int(data.get('quantity', default_quantity))
+
+
+def _cart_error(e):
+    return JsonResponse({
+        'success': False,
+        'message': str(e)
+    }, status=400)
+
+
+def _cart_response(cart, total_price, message=None, items=None):
+    """
+    Cart totals as JSON. ``total_price`` comes first: pricing the cart drops
+    products deleted since they were added, so the item count agrees with it.
+    """
+    data = {'success': True, 'message': message} if message else {}
+    data.update({
+        'cart_total_items': len(cart),
+        'cart_total_price': str(total_price),
+    })
+    if items is not None:
+        data['cart_items'] = items
+    return JsonResponse(data)
+
+
+def _batch_operations(request):
+    """A batch request's parsed operations, and the 400 response to send instead if they are invalid"""
+    try:
+        data = json.loads(request.body)
+        return parse_cart_operations(data.get('operations')), None
+    except (json.JSONDecodeError, AttributeError):
+        return None, _cart_error('Invalid JSON data.')
+    except CartOperationError as e:
+        return None, _cart_error(e)
+
+
+def _batch_product_ids(operations):
+    return {product_id for _, product_id, _ in operations}
+
+
+def _missing_products(product_ids, products):
+    """The 404 response when a batch names a product that does not exist; nothing is applied then"""
+    missing = product_ids - products.keys()
+    if missing:
+        return JsonResponse({
+            'success': False,
+            'message': f'No product matches id {min(missing)}.'
+        }, status=404)
+    return None
+
+
+def _record_purchases(request, cart, added):
+    """Track added products in the purchase history, one insert for all of them"""
+    if added:
+        write_transaction(PurchaseHistory.objects.bulk_create)([
+            PurchaseHistory(product=product, quantity=quantity,
+                            session_key=request.session.session_key, user=cart.user)
+            for product, quantity in added
+        ])
+
+
 @require_POST
 @csrf_exempt
 def add_to_cart(request):
     """AJAX endpoint to add product to cart"""
     try:
-        data = json.loads(request.body)
-        product_id = data.get('product_id')
-        quantity = int(data.get('quantity', 1))
-        
-        product = get_object_or_404(Product, id=product_id)
+        product_id, quantity = _cart_item_request(request, default_quantity=1)
+        product = get_product_or_404(product_id)
         cart = CartManager(request)
         cart.add(product, quantity)
-        
-        # Track purchase in history
-        PurchaseHistory.objects.create(
-            product=product,
-            quantity=quantity,
-            session_key=request.session.session_key,
-            user=request.user if request.user.is_authenticated else None
-        )
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Product added to cart successfully',
-            'cart_total_items': len(cart),
-            'cart_total_price': str(cart.get_total_price())
-        })
+        _record_purchases(request, cart, [(product, quantity)])
+        return _cart_response(cart, cart.get_total_price(), 'Product added to cart successfully')
     except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'message': str(e)
-        }, status=400)
+        return _cart_error(e)
+
+
+@require_POST
+@csrf_exempt
+async def aadd_to_cart(request):
+    """Async ``add_to_cart``, served under the ASGI profile"""
+    try:
+        product_id, quantity = _cart_item_request(request, default_quantity=1)
+        product = await aget_product_or_404(product_id)
+        cart = await CartManager.afor_request(request)
+        cart.add(product, quantity)
+        await sync_to_async(_record_purchases)(request, cart, [(product, quantity)])
+        return _cart_response(cart, await cart.aget_total_price(), 'Product added to cart successfully')
+    except Exception as e:
+        return _cart_error(e)
 
 
 @require_POST
@@ -220,24 +331,25 @@ def add_to_cart(request):
 def remove_from_cart(request):
     """AJAX endpoint to remove product from cart"""
     try:
-        data = json.loads(request.body)
-        product_id = data.get('product_id')
-        
-        product = get_object_or_404(Product, id=product_id)
+        product = get_product_or_404(json.loads(request.body).get('product_id'))
         cart = CartManager(request)
         cart.remove(product)
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Product removed from cart successfully',
-            'cart_total_items': len(cart),
-            'cart_total_price': str(cart.get_total_price())
-        })
+        return _cart_response(cart, cart.get_total_price(), 'Product removed from cart successfully')
     except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'message': str(e)
-        }, status=400)
+        return _cart_error(e)
+
+
+@require_POST
+@csrf_exempt
+async def aremove_from_cart(request):
+    """Async ``remove_from_cart``, served under the ASGI profile"""
+    try:
+        product = await aget_product_or_404(json.loads(request.body).get('product_id'))
+        cart = await CartManager.afor_request(request)
+        cart.remove(product)
+        return _cart_response(cart, await cart.aget_total_price(), 'Product removed from cart successfully')
+    except Exception as e:
+        return _cart_error(e)
 
 
 @require_POST
@@ -245,35 +357,83 @@ def remove_from_cart(request):
 def update_cart_quantity(request):
     """AJAX endpoint to update product quantity in cart"""
     try:
-        data = json.loads(request.body)
-        product_id = data.get('product_id')
-        quantity = int(data.get('quantity'))
-        
-        product = get_object_or_404(Product, id=product_id)
+        product_id, quantity = _cart_item_request(request)
+        product = get_product_or_404(product_id)
         cart = CartManager(request)
         cart.update_quantity(product, quantity)
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Cart updated successfully',
-            'cart_total_items': len(cart),
-            'cart_total_price': str(cart.get_total_price())
-        })
+        return _cart_response(cart, cart.get_total_price(), 'Cart updated successfully')
     except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'message': str(e)
-        }, status=400)
+        return _cart_error(e)
+
+
+@require_POST
+@csrf_exempt
+async def aupdate_cart_quantity(request):
+    """Async ``update_cart_quantity``, served under the ASGI profile"""
+    try:
+        product_id, quantity = _cart_item_request(request)
+        product = await aget_product_or_404(product_id)
+        cart = await CartManager.afor_request(request)
+        cart.update_quantity(product, quantity)
+        return _cart_response(cart, await cart.aget_total_price(), 'Cart updated successfully')
+    except Exception as e:
+        return _cart_error(e)
 
 
 def get_cart_info(request):
     """AJAX endpoint to get current cart information"""
     cart = CartManager(request)
-    return JsonResponse({
-        'cart_total_items': len(cart),
-        'cart_total_price': str(cart.get_total_price()),
-        'cart_items': cart.get_cart_items()
-    })
+    items = cart.get_cart_item_data()
+    return _cart_response(cart, cart.get_total_price(), items=items)
+
+
+async def aget_cart_info(request):
+    """Async ``get_cart_info``, served under the ASGI profile"""
+    cart = await CartManager.afor_request(request)
+    items = await cart.aget_cart_item_data()
+    return _cart_response(cart, await cart.aget_total_price(), items=items)
+
+
+@require_POST
+@csrf_exempt
+def batch_update_cart(request):
+    """AJAX endpoint applying an ordered list of add/update/remove operations in one round trip"""
+    operations, invalid = _batch_operations(request)
+    if invalid:
+        return invalid
+
+    # Every product in the batch, in one query
+    product_ids = _batch_product_ids(operations)
+    products = Product.objects.only(*PRODUCT_CACHE_FIELDS).in_bulk(product_ids)
+    missing = _missing_products(product_ids, products)
+    if missing:
+        return missing
+
+    cart = CartManager(request)
+    _record_purchases(request, cart, cart.apply_operations(operations, products))
+    items = cart.get_cart_item_data()
+    return _cart_response(cart, cart.get_total_price(), 'Cart updated successfully', items)
+
+
+@require_POST
+@csrf_exempt
+async def abatch_update_cart(request):
+    """Async ``batch_update_cart``, served under the ASGI profile"""
+    operations, invalid = _batch_operations(request)
+    if invalid:
+        return invalid
+
+    # Every product in the batch, in one query
+    product_ids = _batch_product_ids(operations)
+    products = await Product.objects.only(*PRODUCT_CACHE_FIELDS).ain_bulk(product_ids)
+    missing = _missing_products(product_ids, products)
+    if missing:
+        return missing
+
+    cart = await CartManager.afor_request(request)
+    await sync_to_async(_record_purchases)(request, cart, cart.apply_operations(operations, products))
+    items = await cart.aget_cart_item_data()
+    return _cart_response(cart, await cart.aget_total_price(), 'Cart updated successfully', items)
 
 
 # Dashboard Views
@@ -330,12 +490,16 @@ def dashboard(request):
         'in_stock_products': in_stock_products,
         'low_stock_products': low_stock_products,
         'out_of_stock_products': out_of_stock_products,
+        'sales': sales_summary(),
     }
     return render(request, 'dashboard.html', context)
 
 
 def add_product(request):
     """View for adding a new product"""
+    # Dashboard-only modules are imported on first use, not at worker boot
+    from .forms import ProductForm
+
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES)
         if form.is_valid():
@@ -355,6 +519,8 @@ def add_product(request):
 
 def edit_product(request, product_id):
     """View for editing an existing product"""
+    from .forms import ProductForm
+
     product = get_object_or_404(Product, id=product_id)
     
     if request.method == 'POST':
@@ -374,6 +540,85 @@ def edit_product(request, product_id):
     return render(request, 'product_form.html', context)
 
 
+@staff_member_required
+@require_POST
+@csrf_exempt
+def import_products_csv(request):
+    """AJAX endpoint streaming a CSV product import as NDJSON progress lines"""
+    from .importer import import_products, open_rejects_writer
+
+    upload = request.FILES.get('csv_file')
+    if not upload:
+        return JsonResponse({
+            'success': False,
+            'message': 'Please choose a CSV file to import.'
+        }, status=400)
+
+    import_dir = Path(settings.PRODUCT_IMPORT_DIR)
+    import_dir.mkdir(parents=True, exist_ok=True)
+    rejects_name = f'rejected-{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.csv'
+    rejects_path = import_dir / rejects_name
+
+    def progress():
+        stats = {'rejected': 0}
+        with open(rejects_path, 'w', newline='', encoding='utf-8') as handle:
+            rejects = open_rejects_writer(handle)
+            try:
+                for stats in import_products(codecs.iterdecode(upload, 'utf-8-sig'), rejects):
+                    if stats['done'] and stats['rejected']:
+                        stats['rejects_url'] = reverse('download_import_rejects', args=[rejects_name])
+                    yield json.dumps(stats) + '\n'
+            except ValueError as e:
+                yield json.dumps({'done': True, 'error': str(e)}) + '\n'
+        if not stats['rejected']:
+            rejects_path.unlink()
+
+    return StreamingHttpResponse(progress(), content_type='application/x-ndjson')
+
+
+@staff_member_required
+def download_import_rejects(request, filename):
+    """Download the rejected-rows file of a dashboard import"""
+    try:
+        path = safe_join(settings.PRODUCT_IMPORT_DIR, filename)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+    except (OSError, SuspiciousFileOperation):
+        raise Http404('Rejected rows file not found')
+
+
+@staff_member_required
+def export_dataset(request, dataset):
+    """Stream purchases, reviews or visitor logs as CSV or NDJSON"""
+    from .exports import ExportError, encode_rows, export_rows
+
+    fmt = request.GET.get('format', 'csv')
+    try:
+        lines = encode_rows(
+            export_rows(dataset, request.GET.get('start'), request.GET.get('end')),
+            fmt
+        )
+    except ExportError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=400)
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(lines, content_type=f'{content_type}; charset=utf-8')
+    filename = f'{dataset}-{timezone.now():%Y%m%d}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@staff_member_required
+def product_cache_stats(request):
+    """Hit, miss and eviction counters of this worker's product cache"""
+    return JsonResponse({
+        'success': True,
+        'stats': product_cache.snapshot()
+    })
+
+
 @require_POST
 @csrf_exempt
 def delete_product(request, product_id):
@@ -381,7 +626,8 @@ def delete_product(request, product_id):
     try:
         product = get_object_or_404(Product, id=product_id)
         product_name = product.name
-        product.delete()
+        # Hidden at once; purge_deleted_products removes its history in the background
+        product.soft_delete()
         
         return JsonResponse({
             'success': True,
@@ -468,66 +714,126 @@ def update_product_partial(request, product_id):
         }, status=400)
 
 
+@staff_member_required
 @require_POST
 @csrf_exempt
-def submit_review(request):
-    """AJAX endpoint to submit a product review"""
+def bulk_update_products(request):
+    """AJAX endpoint applying many product changes in one transaction"""
+    from .bulk import BulkOperationError, apply_bulk_operations
+
     try:
         data = json.loads(request.body)
-        product_id = data.get('product_id')
-        rating = int(data.get('rating'))
-        comment = data.get('comment', '').strip()
-        reviewer_name = data.get('reviewer_name', 'Anonymous').strip()
-        
-        # Validate input
-        if not product_id or not rating or rating < 1 or rating > 5:
-            return JsonResponse({
-                'success': False,
-                'message': 'Invalid product ID or rating.'
-            }, status=400)
-            
-        if not comment:
-            return JsonResponse({
-                'success': False,
-                'message': 'Comment is required.'
-            }, status=400)
-        
-        product = get_object_or_404(Product, id=product_id)
-        
-        # Create the review
-        review = Review.objects.create(
-            product=product,
-            reviewer_name=reviewer_name if reviewer_name else 'Anonymous',
-            rating=rating,
-            comment=comment
-        )
-        
-        # Calculate new average rating
-        reviews = Review.objects.filter(product=product)
-        avg_rating = 0
-        if reviews.exists():
-            total_rating = sum(r.rating for r in reviews)
-            avg_rating = round(total_rating / reviews.count(), 1)
-        
+        success, results = apply_bulk_operations(data.get('operations'))
+    except (json.JSONDecodeError, AttributeError):
         return JsonResponse({
-            'success': True,
-            'message': 'Review submitted successfully!',
-            'review': {
-                'id': review.id,
-                'reviewer_name': review.reviewer_name,
-                'rating': review.rating,
-                'comment': review.comment,
-                'created_at': review.created_at.strftime('%B %d, %Y')
-            },
-            'avg_rating': avg_rating,
-            'review_count': reviews.count()
-        })
-        
-    except Exception as e:
+            'success': False,
+            'message': 'Invalid JSON data.'
+        }, status=400)
+    except BulkOperationError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=400)
+
+    if not success:
         return JsonResponse({
             'success': False,
-            'message': f'Error submitting review: {str(e)}'
+            'message': 'No products were updated.',
+            'results': results
+        }, status=400)
+    return JsonResponse({
+        'success': True,
+        'message': f'{len(results)} products updated successfully.',
+        'results': results
+    })
+
+
+def _review_submission(request):
+    """
+    The product id and ``Review`` fields of a review submission, and the
+    400 response to send instead when they are invalid
+    """
+    data = json.loads(request.body)
+    product_id = data.get('product_id')
+    rating = int(data.get('rating'))
+    comment = data.get('comment', '').strip()
+    reviewer_name = data.get('reviewer_name', 'Anonymous').strip()
+
+    invalid = None
+    if not product_id or not rating or rating < 1 or rating > 5:
+        invalid = 'Invalid product ID or rating.'
+    elif not comment:
+        invalid = 'Comment is required.'
+    if invalid:
+        invalid = JsonResponse({
+            'success': False,
+            'message': invalid
         }, status=400)
+    fields = {'reviewer_name': reviewer_name or 'Anonymous', 'rating': rating, 'comment': comment}
+    return product_id, fields, invalid
+
+
+def _review_data(review):
+    return {
+        'id': review.id,
+        'reviewer_name': review.reviewer_name,
+        'rating': review.rating,
+        'comment': review.comment,
+        'created_at': review.created_at.strftime('%B %d, %Y')
+    }
+
+
+def _average_rating(stats):
+    return round(stats['avg'], 1) if stats['count'] else 0
+
+
+def _review_response(review, stats):
+    return JsonResponse({
+        'success': True,
+        'message': 'Review submitted successfully!',
+        'review': _review_data(review),
+        'avg_rating': _average_rating(stats),
+        'review_count': stats['count']
+    })
+
+
+def _review_error(e):
+    return JsonResponse({
+        'success': False,
+        'message': f'Error submitting review: {str(e)}'
+    }, status=400)
+
+
+@require_POST
+@csrf_exempt
+def submit_review(request):
+    """AJAX endpoint to submit a product review"""
+    try:
+        product_id, fields, invalid = _review_submission(request)
+        if invalid:
+            return invalid
+        product = get_product_or_404(product_id)
+        review = write_transaction(Review.objects.create)(product=product, **fields)
+        stats = Review.objects.filter(product=product).aggregate(avg=Avg('rating'), count=Count('id'))
+        return _review_response(review, stats)
+    except Exception as e:
+        return _review_error(e)
+
+
+@require_POST
+@csrf_exempt
+async def asubmit_review(request):
+    """Async ``submit_review``, served under the ASGI profile"""
+    try:
+        product_id, fields, invalid = _review_submission(request)
+        if invalid:
+            return invalid
+        product = await aget_product_or_404(product_id)
+        review = await sync_to_async(write_transaction(Review.objects.create))(product=product, **fields)
+        stats = await Review.objects.filter(product=product).aaggregate(avg=Avg('rating'), count=Count('id'))
+        return _review_response(review, stats)
+    except Exception as e:
+        return _review_error(e)
 
 
 def toggle_product_availability(request, product_id):
@@ -550,66 +856,83 @@ def toggle_product_availability(request, product_id):
         }, status=400)
 
 
+def _site_review_submission(request):
+    """
+    ``SiteReview`` fields from the site review form, and the 400 response
+    to send instead when they are invalid
+    """
+    # Handle FormData from the form submission
+    reviewer_name = request.POST.get('reviewer_name', '').strip()
+    rating = int(request.POST.get('rating', 0))
+    comment = request.POST.get('comment', '').strip()
+    email = request.POST.get('email', '').strip()
+
+    invalid = None
+    if not rating or rating < 1 or rating > 5:
+        invalid = 'Please provide a valid rating (1-5 stars)'
+    elif not comment:
+        invalid = 'Please provide a comment'
+    if invalid:
+        invalid = JsonResponse({
+            'success': False,
+            'error': invalid
+        }, status=400)
+    fields = {
+        'reviewer_name': reviewer_name or 'Anonymous',
+        'rating': rating,
+        'comment': comment,
+        'email': email or None,
+    }
+    return fields, invalid
+
+
+def _site_review_response(site_review, stats):
+    return JsonResponse({
+        'success': True,
+        'message': 'Thank you for your review!',
+        'review': _review_data(site_review),
+        'new_average': _average_rating(stats),
+        'review_count': stats['count']
+    })
+
+
+def _site_review_error(e):
+    if isinstance(e, ValueError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid rating value'
+        }, status=400)
+    return JsonResponse({
+        'success': False,
+        'message': 'An error occurred while submitting your review'
+    }, status=500)
+
+
 @require_POST
 @csrf_exempt
 def submit_site_review(request):
     """AJAX endpoint to submit site-wide review"""
     try:
-        # Handle FormData from the form submission
-        reviewer_name = request.POST.get('reviewer_name', '').strip()
-        rating = int(request.POST.get('rating', 0))
-        comment = request.POST.get('comment', '').strip()
-        email = request.POST.get('email', '').strip()
-        
-        # Validate required fields
-        if not rating or rating < 1 or rating > 5:
-            return JsonResponse({
-                'success': False,
-                'error': 'Please provide a valid rating (1-5 stars)'
-            }, status=400)
-        
-        if not comment:
-            return JsonResponse({
-                'success': False,
-                'error': 'Please provide a comment'
-            }, status=400)
-        
-        # Create the site review
-        site_review = SiteReview.objects.create(
-            reviewer_name=reviewer_name if reviewer_name else 'Anonymous',
-            rating=rating,
-            comment=comment,
-            email=email if email else None
-        )
-        
-        # Calculate new average rating
-        site_reviews = SiteReview.objects.filter(is_approved=True)
-        site_avg_rating = 0
-        if site_reviews.exists():
-            total_rating = sum(review.rating for review in site_reviews)
-            site_avg_rating = round(total_rating / site_reviews.count(), 1)
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Thank you for your review!',
-            'review': {
-                'id': site_review.id,
-                'reviewer_name': site_review.reviewer_name,
-                'rating': site_review.rating,
-                'comment': site_review.comment,
-                'created_at': site_review.created_at.strftime('%B %d, %Y')
-            },
-            'new_average': site_avg_rating,
-            'review_count': site_reviews.count()
-        })
-        
-    except ValueError as e:
-        return JsonResponse({
-            'success': False,
-            'message': 'Invalid rating value'
-        }, status=400)
+        fields, invalid = _site_review_submission(request)
+        if invalid:
+            return invalid
+        site_review = write_transaction(SiteReview.objects.create)(**fields)
+        stats = SiteReview.objects.filter(is_approved=True).aggregate(avg=Avg('rating'), count=Count('id'))
+        return _site_review_response(site_review, stats)
     except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'message': 'An error occurred while submitting your review'
-        }, status=500)
\ No newline at end of file
+        return _site_review_error(e)
+
+
+@require_POST
+@csrf_exempt
+async def asubmit_site_review(request):
+    """Async ``submit_site_review``, served under the ASGI profile"""
+    try:
+        fields, invalid = _site_review_submission(request)
+        if invalid:
+            return invalid
+        site_review = await sync_to_async(write_transaction(SiteReview.objects.create))(**fields)
+        stats = await SiteReview.objects.filter(is_approved=True).aaggregate(avg=Avg('rating'), count=Count('id'))
+        return _site_review_response(site_review, stats)
+    except Exception as e:
+        return _site_review_error(e)
\ No newline at end of file
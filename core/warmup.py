@@ -0,0 +1,64 @@
+import logging
+import time
+
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from .metrics import load_metrics
+from .models import Product
+from .product_cache import product_cache
+from .rankings import RANKING_KINDS, get_ranking
+
+
+logger = logging.getLogger(__name__)
+
+# Pages whose first render would otherwise compile these on a live request
+HOT_TEMPLATES = (
+    'base.html',
+    'home.html',
+    'product.html',
+    'search.html',
+    'cart.html',
+    'includes/header.html',
+    'includes/product_card.html',
+    'includes/recommendation_strip.html',
+    'includes/slider.html',
+)
+
+
+def warm_code():
+    """
+    Build everything that needs no database: URL resolver, compiled
+    templates and the Prometheus metrics. Safe in the gunicorn master
+    before fork, where the result is shared copy-on-write by every worker.
+    """
+    get_resolver()._populate()
+    load_metrics()
+    for name in HOT_TEMPLATES:
+        get_template(name)
+
+
+def warm_data():
+    """
+    Per-worker warm-up: open the database connection (and apply its
+    pragmas), fill the shared ranking cache and this worker's product LRU
+    with the bestsellers and trending products.
+    """
+    connections['default'].ensure_connection()
+    product_ids = set()
+    for kind in RANKING_KINDS:
+        product_ids.update(product_id for _, product_id in get_ranking(kind))
+    for product_id in product_ids:
+        try:
+            product_cache.get(product_id)
+        except Product.DoesNotExist:
+            pass
+
+
+def warm_up(data=True):
+    started = time.perf_counter()
+    warm_code()
+    if data:
+        warm_data()
+    logger.info('Warmed up in %.0f ms', (time.perf_counter() - started) * 1000)
@@ -0,0 +1,104 @@
+# Production gunicorn settings; gunicorn loads this file from the project
+# root automatically.
+#
+#   gunicorn Dr_Ahmed.wsgi                                      (default, threaded WSGI)
+#   GUNICORN_PROFILE=asgi gunicorn Dr_Ahmed.asgi:application    (uvicorn workers)
+#
+# WEB_CONCURRENCY, GUNICORN_THREADS, GUNICORN_MAX_REQUESTS and
+# GUNICORN_MAX_REQUESTS_JITTER override the computed values.
+import gc
+import glob
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Workers write metrics here and /metrics sums them (see core.metrics).
+# Set up before prometheus_client is first imported, which picks the mode.
+# Unless PROMETHEUS_MULTIPROC_DIR is set, each server gets a temporary
+# directory of its own, so two servers on one host never mix or clear each
+# other's samples; on_exit removes it. In a directory that is set,
+# on_starting clears the previous run's samples.
+OWN_METRICS_DIR = 'PROMETHEUS_MULTIPROC_DIR' not in os.environ
+if OWN_METRICS_DIR:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='dr_ahmed_metrics-')
+METRICS_DIR = os.environ['PROMETHEUS_MULTIPROC_DIR']
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+# Imported up front: child_exit runs from the SIGCHLD handler, where a
+# first import could interrupt another one
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def available_cores():
+    # Honours CPU affinity/cgroup pinning where the platform exposes it
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
+PROFILE = os.environ.get('GUNICORN_PROFILE', 'wsgi')
+cores = available_cores()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+if PROFILE == 'asgi':
+    # Concurrency comes from the event loop, one worker per core is enough
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cores))
+else:
+    # Threads cover the short waits on SQLite and the session store; SQLite
+    # takes one writer at a time, so the process count stays modest
+    worker_class = 'gthread'
+    workers = int(os.environ.get('WEB_CONCURRENCY', min(2 * cores + 1, 9)))
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Recycle workers so slow leaks never reach production memory limits; the
+# jitter keeps them from all restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# Import Django once in the master and fork: workers share its pages
+# copy-on-write and start serving immediately
+preload_app = True
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+accesslog = '-'
+
+
+def on_starting(server):
+    # Only prometheus_client's own sample files: the directory may be one the
+    # operator also uses for something else
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.db')):
+        os.remove(path)
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+    from core.warmup import warm_up
+
+    # Compile templates and the URL resolver once, before the fork
+    warm_up(data=False)
+    # A SQLite connection must never be shared across processes
+    connections.close_all()
+    # Move everything loaded so far out of the collector's reach, so GC
+    # passes in the workers do not write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    from core.warmup import warm_up
+
+    # Each worker opens its own connection and fills its own caches
+    warm_up(data=True)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if OWN_METRICS_DIR:
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)